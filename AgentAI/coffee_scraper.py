@@ -1,22 +1,109 @@
+import hashlib
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
-from geopy.distance import geodesic
 from llama_index.core.query_engine import PandasQueryEngine
 
+# Every (query, page) request goes out at once over one pooled keep-alive
+# session, retried with exponential backoff on connection errors, 429 and 5xx.
+# Responses are cached on disk per request payload for SCRAPE_CACHE_TTL seconds:
+# a warm start sends no request at all, and a refresh only re-fetches the pages
+# that expired (an expired page is still used if its refresh fails).
+# SCRAPELESS_URL can point at a stand-in server (see fake_scrapeless.py).
+SCRAPELESS_URL = os.getenv("SCRAPELESS_URL", "https://api.scrapeless.com/api/v1/scraper/request")
+SCRAPE_PAGES = int(os.getenv("SCRAPE_PAGES", "3"))        # result pages per query
+PAGE_SIZE = 20                                             # Google Maps results per page ("start" step)
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "8"))
+SCRAPE_RETRIES = int(os.getenv("SCRAPE_RETRIES", "3"))
+SCRAPE_BACKOFF = float(os.getenv("SCRAPE_BACKOFF", "0.5"))  # seconds, doubled on each retry
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "30"))
+SCRAPE_CACHE_DIR = os.getenv("SCRAPE_CACHE_DIR", os.path.join("storage", "scrapeless"))
+SCRAPE_CACHE_TTL = float(os.getenv("SCRAPE_CACHE_TTL", str(24 * 3600)))
+
+EARTH_RADIUS_KM = 6371.0088  # mean Earth radius (IUGG)
+COLUMNS = ["name", "address", "price_level", "rating", "latitude", "longitude", "distance_km", "scraped_at"]
+
+
+def haversine_km(lat, lon, anchor):
+    """Great-circle distance in km from anchor (lat, lon) to every point of the lat/lon arrays.
+
+    Within 0.5% of the ellipsoidal (geodesic) distance, i.e. metres at city scale.
+    """
+    lat1, lon1 = np.radians(anchor[0]), np.radians(anchor[1])
+    lat2, lon2 = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def make_session(pool_size=SCRAPE_WORKERS, retries=SCRAPE_RETRIES, backoff=SCRAPE_BACKOFF):
+    """requests.Session with a connection pool sized for the workers and bounded retries"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=None,  # the scraper API is called with POST, which is safe to repeat
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ResponseCache:
+    """On-disk cache of API responses, one JSON file per request payload"""
+
+    def __init__(self, directory=SCRAPE_CACHE_DIR, ttl=SCRAPE_CACHE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, payload):
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, payload, allow_expired=False):
+        """Cached response, or None if there is none (or it is older than ttl, unless allow_expired)"""
+        path = self._path(payload)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not allow_expired and time.time() - entry["fetched_at"] > self.ttl:
+            return None
+        return entry["response"]
+
+    def put(self, payload, response):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(payload)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "payload": payload, "response": response}, f)
+        os.replace(tmp, path)
+
+
 class CoffeeScraper:
     def __init__(self):
         self.api_token = os.getenv("SCRAPELESS_API_TOKEN")
         self.gallery_coords = (45.4299, -75.6939)  # National Gallery
-        self.df = pd.DataFrame(columns=[
-            "name", "address", "price_level",
-            "rating", "distance_km", "scraped_at"
-        ])
-
-    def _send_scrapeless_request(self, query: str):
-        host = "api.scrapeless.com"
-        url = f"https://{host}/api/v1/scraper/request"
-        payload = {
+        self.df = pd.DataFrame(columns=COLUMNS)
+        self.session = make_session()
+        self.cache = ResponseCache()
+        self.requests_sent = 0
+        self._count_lock = threading.Lock()
+
+    @staticmethod
+    def _payload(query: str, start: int = 0):
+        return {
             "actor": "scraper.google.maps",
             "input": {
                 "q": query,
@@ -28,36 +115,99 @@ class CoffeeScraper:
                 "hl": "en-sg",
                 "data": "",
                 "place_id": "",
-                "start": ""
+                "start": str(start) if start else ""
             }
         }
-        response = requests.post(
-            url,
-            headers={"x-api-token": self.api_token},
-            json=payload
-        )
-        if response.status_code == 200:
-            res_data = response.json()
-            return res_data["local_results"]
-        else:
-            raise Exception(f"Scraping failed: {response.text}")
 
-    def scrape_nearby_coffee(self):
+    def _send_scrapeless_request(self, query: str, start: int = 0):
+        """One page of results (from the cache while it is fresh)"""
+        payload = self._payload(query, start)
+        cached = self.cache.get(payload)
+        if cached is not None:
+            return cached
+
         try:
-            results = self._send_scrapeless_request("coffee")
+            with self._count_lock:
+                self.requests_sent += 1
+            response = self.session.post(
+                SCRAPELESS_URL,
+                headers={"x-api-token": self.api_token},
+                json=payload,
+                timeout=SCRAPE_TIMEOUT
+            )
+            if response.status_code != 200:
+                raise Exception(f"Scraping failed: {response.text}")
+            results = response.json().get("local_results", [])
+        except Exception:
+            # Better an old page than none
+            stale = self.cache.get(payload, allow_expired=True)
+            if stale is None:
+                raise
+            print(f"⚠️ Using expired cached results for '{query}' (start={start})")
+            return stale
+
+        self.cache.put(payload, results)
+        return results
+
+    def fetch_places(self, queries=("coffee",), pages=SCRAPE_PAGES):
+        """All result pages of all queries, fetched concurrently; places seen twice are kept once"""
+        requests_to_send = [(query, page * PAGE_SIZE) for query in queries for page in range(pages)]
+        with ThreadPoolExecutor(max_workers=max(1, min(SCRAPE_WORKERS, len(requests_to_send)))) as pool:
+            futures = [pool.submit(self._send_scrapeless_request, query, start)
+                       for query, start in requests_to_send]
+
+        places, seen, errors = [], set(), []
+        for (query, start), future in zip(requests_to_send, futures):
+            try:
+                page = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            for place in page:
+                key = place.get("place_id") or (place.get("title"), place.get("address"))
+                if key not in seen:
+                    seen.add(key)
+                    places.append(place)
+        if errors and len(errors) == len(futures):
+            raise errors[0]
+        if errors:
+            print(f"⚠️ {len(errors)} of {len(futures)} result pages failed: {errors[0]}")
+        return places
+
+    def scrape_nearby_coffee(self, queries=("coffee",), pages=SCRAPE_PAGES):
+        try:
+            results = self.fetch_places(queries, pages)
+            # Collect column by column, then build the DataFrame (and distances) once
+            columns = {column: [] for column in ["name", "address", "price_level", "rating", "latitude", "longitude"]}
             for place in results:
-                shop_coords = (place["gps_coordinates"]["latitude"], place["gps_coordinates"]["longitude"])
-                self.df = pd.concat([self.df, pd.DataFrame([{
-                    "name": place["title"],
-                    "address": place["address"],
-                    "price_level": len(place.get("price", "")),
-                    "rating": place.get("rating", None),
-                    "distance_km": round(geodesic(self.gallery_coords, shop_coords).km, 2),
-                    "scraped_at": pd.Timestamp.now()
-                }])], ignore_index=True)
+                coords = place.get("gps_coordinates") or {}
+                columns["name"].append(place["title"])
+                columns["address"].append(place["address"])
+                columns["price_level"].append(len(place.get("price", "")))
+                columns["rating"].append(place.get("rating", None))
+                columns["latitude"].append(coords.get("latitude", np.nan))
+                columns["longitude"].append(coords.get("longitude", np.nan))
+
+            shops = pd.DataFrame(columns)
+            shops["distance_km"] = self.distances_from(self.gallery_coords, shops)
+            shops["scraped_at"] = pd.Timestamp.now()
+            if not self.df.empty:
+                # A rescrape replaces the shops already known instead of repeating them
+                shops = pd.concat([self.df, shops[COLUMNS]], ignore_index=True)
+                shops = shops.drop_duplicates(["name", "address"], keep="last").reset_index(drop=True)
+            self.df = shops[COLUMNS]
         except Exception as e:
             print(f"Scraping failed: {str(e)}")
 
+    def distances_from(self, anchor, df=None):
+        """distance_km (rounded to 10 m) from any (lat, lon) anchor to every shop"""
+        df = self.df if df is None else df
+        return pd.Series(np.round(haversine_km(df["latitude"], df["longitude"], anchor), 2), index=df.index)
+
+    def set_anchor(self, anchor):
+        """Recompute distance_km against another point than the gallery"""
+        self.df["distance_km"] = self.distances_from(anchor)
+
     def get_query_engine(self):
         return PandasQueryEngine(
             df=self.df,
@@ -0,0 +1,313 @@
+import ast
+import json
+import operator
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+# Larger-than-memory backend for SimplePandasQueryEngine: the data stays in a
+# memory-mapped Parquet file (or directory of files) and only what a generated
+# expression needs is read:
+#
+#   - projection: the columns the expression mentions (when its result can't
+#     depend on the others)
+#   - predicate: a filter like df[(df['A'] > 5) & df['B'].isin([...])] is run by
+#     the Parquet scan, which also skips row groups whose statistics exclude it
+#
+# The expression then runs unchanged on that (much smaller) pandas DataFrame
+# (whose row labels start at 0 after a filtered read).
+# The prompt describes the table with a fixed-size summary of its columns
+# (type, range, cardinality, examples) computed in one streaming pass and saved
+# next to the data, instead of rendering rows.
+SUMMARY_MAX_CHARS = int(os.getenv("COLUMNAR_SUMMARY_MAX_CHARS", "3000"))
+MAX_DISTINCT = 1000     # distinct values counted exactly up to this many per column
+MAX_EXAMPLES = 20       # string columns with at most this many values list them all
+ROW_GROUP_SIZE = 128 * 1024
+
+# Frame methods that keep the columns (a column selection after them still narrows the read)
+ROW_METHODS = {"head", "tail", "nlargest", "nsmallest", "sort_values", "sort_index", "dropna", "reset_index",
+               "groupby"}
+
+_COMPARE = {ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt, ast.LtE: operator.le,
+            ast.Eq: operator.eq, ast.NotEq: operator.ne}
+_MIRROR = {ast.Gt: ast.Lt, ast.GtE: ast.LtE, ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Eq: ast.Eq, ast.NotEq: ast.NotEq}
+
+
+def csv_to_parquet(csv_path, parquet_path, row_group_size=ROW_GROUP_SIZE):
+    """Stream a CSV into a Parquet file block by block (never holds the whole file in memory)"""
+    os.makedirs(os.path.dirname(parquet_path) or ".", exist_ok=True)
+    reader = pv.open_csv(csv_path)
+    with pq.ParquetWriter(parquet_path + ".tmp", reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch, row_group_size=row_group_size)
+    os.replace(parquet_path + ".tmp", parquet_path)
+    return parquet_path
+
+
+def _signature(path):
+    if os.path.isdir(path):
+        stats = [os.stat(os.path.join(root, name)) for root, _, names in os.walk(path) for name in sorted(names)]
+    else:
+        stats = [os.stat(path)]
+    return ";".join(f"{stat.st_size}:{stat.st_mtime_ns}" for stat in stats)
+
+
+# ----------------- Column summary -----------------
+class _ColumnStats:
+    def __init__(self, field):
+        self.field = field
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.distinct = set()
+        self.too_many = False
+
+    def update(self, array):
+        self.nulls += array.null_count
+        if pa.types.is_integer(self.field.type) or pa.types.is_floating(self.field.type) \
+                or pa.types.is_temporal(self.field.type):
+            bounds = pc.min_max(array)
+            low, high = bounds["min"].as_py(), bounds["max"].as_py()
+            if low is not None:
+                self.min = low if self.min is None else min(self.min, low)
+                self.max = high if self.max is None else max(self.max, high)
+        if not self.too_many:
+            self.distinct.update(value for value in pc.unique(array.drop_null()).to_pylist())
+            if len(self.distinct) > MAX_DISTINCT:
+                self.too_many = True
+                self.distinct = set(sorted(self.distinct, key=str)[:3])
+
+    def describe(self):
+        parts = []
+        if self.min is not None:
+            parts.append(f"{_short(self.min)} to {_short(self.max)}")
+        parts.append(f">{MAX_DISTINCT} distinct" if self.too_many else f"{len(self.distinct)} distinct")
+        if self.nulls:
+            parts.append(f"{self.nulls} missing")
+        if pa.types.is_string(self.field.type) or pa.types.is_large_string(self.field.type):
+            values = sorted(self.distinct, key=str)
+            if not self.too_many and len(values) <= MAX_EXAMPLES:
+                parts.append("values " + ", ".join(repr(value) for value in values))
+            else:
+                parts.append("e.g. " + ", ".join(repr(value) for value in values[:3]))
+        return f"- {self.field.name} ({self.field.type}): " + ", ".join(parts)
+
+
+def _short(value):
+    return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+
+def summarize(dataset, max_chars=SUMMARY_MAX_CHARS):
+    """Schema and statistics of every column, in one streaming pass over the data"""
+    stats = [_ColumnStats(field) for field in dataset.schema]
+    rows = 0
+    for batch in dataset.to_batches():
+        rows += batch.num_rows
+        for column, array in zip(stats, batch.columns):
+            column.update(array)
+
+    lines = [f"Table with {rows} rows and {len(stats)} columns (only a summary is shown, not the rows):"]
+    used = len(lines[0])
+    for i, column in enumerate(stats):
+        line = column.describe()
+        if used + len(line) > max_chars:
+            # Keep the prompt the same size however wide the table is
+            rest = ", ".join(other.field.name for other in stats[i:])
+            lines.append(f"- {len(stats) - i} more columns: {rest[:max(0, max_chars - used - 40)]}...")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return rows, "\n".join(lines)
+
+
+# ----------------- Pushdown -----------------
+def _slice(node):
+    index = getattr(ast, "Index", None)  # Python < 3.9 wraps subscripts
+    return node.slice.value if index is not None and isinstance(node.slice, index) else node.slice
+
+
+def _is_df(node):
+    return isinstance(node, ast.Name) and node.id == "df"
+
+
+def _column_names(node, columns):
+    """Column names selected by a subscript ('A' or ['A', 'B']), or None"""
+    if isinstance(node, ast.Constant) and node.value in columns:
+        return [node.value]
+    if isinstance(node, ast.List) and node.elts and all(
+            isinstance(elt, ast.Constant) and elt.value in columns for elt in node.elts):
+        return [elt.value for elt in node.elts]
+    return None
+
+
+def _field(node, columns):
+    """ds.field for df['A'] / df.A, or None"""
+    if isinstance(node, ast.Subscript) and _is_df(node.value):
+        names = _column_names(_slice(node), columns)
+        if names and isinstance(_slice(node), ast.Constant):
+            return ds.field(names[0])
+    if isinstance(node, ast.Attribute) and _is_df(node.value) and node.attr in columns:
+        return ds.field(node.attr)
+    return None
+
+
+class _NotPushable(Exception):
+    pass
+
+
+def to_arrow_filter(node, columns):
+    """Translate a pandas boolean condition on df into a dataset filter (raises _NotPushable)"""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        left, right = to_arrow_filter(node.left, columns), to_arrow_filter(node.right, columns)
+        return left & right if isinstance(node.op, ast.BitAnd) else left | right
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        return ~to_arrow_filter(node.operand, columns)
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _COMPARE:
+        op, left, right = type(node.ops[0]), node.left, node.comparators[0]
+        if _field(left, columns) is None:
+            op, left, right = _MIRROR[op], right, left
+        field = _field(left, columns)
+        if field is None:
+            raise _NotPushable()
+        result = _COMPARE[op](field, _literal(right))
+        # Missing values never match in pandas (and always differ for !=); keeping every
+        # leaf null-free makes ~, & and | behave the same here as on the DataFrame
+        return result | field.is_null() if op is ast.NotEq else result & ~field.is_null()
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and not node.keywords:
+        field = _field(node.func.value, columns)
+        method = node.func.attr
+        if field is not None and method == "isin" and len(node.args) == 1:
+            return field.isin(list(_literal(node.args[0])))
+        if field is not None and method == "between" and len(node.args) == 2:
+            return (field >= _literal(node.args[0])) & (field <= _literal(node.args[1])) & ~field.is_null()
+        if field is not None and method in ("isna", "isnull") and not node.args:
+            return field.is_null()
+        if field is not None and method in ("notna", "notnull") and not node.args:
+            return ~field.is_null()
+    raise _NotPushable()
+
+
+def _literal(node):
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise _NotPushable()
+
+
+def _row_condition(node):
+    """The row condition of df[cond] / df.loc[cond] / df.loc[cond, cols], or None"""
+    if not isinstance(node, ast.Subscript):
+        return None
+    if _is_df(node.value):
+        return _slice(node)
+    if isinstance(node.value, ast.Attribute) and node.value.attr == "loc" and _is_df(node.value.value):
+        index = _slice(node)
+        return index.elts[0] if isinstance(index, ast.Tuple) and len(index.elts) == 2 else index
+    return None
+
+
+def _narrowed(name, parents, columns):
+    """True when this use of df only reaches the data through explicit column selections"""
+    node = name
+    while True:
+        parent = parents.get(node)
+        if isinstance(parent, ast.Subscript) and parent.value is node:
+            if _column_names(_slice(parent), columns):
+                return True
+            node = parent  # row filter: the frame keeps its columns
+        elif isinstance(parent, ast.Attribute) and parent.value is node:
+            if parent.attr in columns:
+                return True
+            grandparent = parents.get(parent)
+            if parent.attr == "loc" and isinstance(grandparent, ast.Subscript):
+                index = _slice(grandparent)
+                if isinstance(index, ast.Tuple) and len(index.elts) == 2:
+                    return _column_names(index.elts[1], columns) is not None
+                node = grandparent
+            elif parent.attr in ROW_METHODS and isinstance(grandparent, ast.Call) and grandparent.func is parent:
+                node = grandparent
+            else:
+                return False
+        else:
+            return False
+
+
+def plan_scan(tree, columns):
+    """(columns to read, or None for all; dataset filter, or None) for a parsed expression"""
+    columns = set(columns)
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    uses = [node for node in ast.walk(tree) if _is_df(node)]
+
+    # Projection: every use of df ends in a column selection -> read only the mentioned columns
+    projection = None
+    if uses and all(_narrowed(use, parents, columns) for use in uses):
+        mentioned = {node.value for node in ast.walk(tree) if isinstance(node, ast.Constant)} \
+            | {node.attr for node in ast.walk(tree) if isinstance(node, ast.Attribute)}
+        projection = sorted(columns & mentioned)
+
+    # Predicate: only when every use of df goes through the same pushable row filter
+    conditions = []
+    for node in ast.walk(tree):
+        condition = _row_condition(node)
+        if condition is None:
+            continue
+        try:
+            expression = to_arrow_filter(condition, columns)
+        except _NotPushable:
+            continue
+        inner_uses = sum(1 for child in ast.walk(condition) if _is_df(child))
+        conditions.append((ast.dump(condition), expression, inner_uses + 1))
+    predicate = None
+    if conditions and len({dump for dump, _, _ in conditions}) == 1 \
+            and sum(count for _, _, count in conditions) == len(uses):
+        predicate = conditions[0][1]
+    return projection, predicate
+
+
+# ----------------- Table -----------------
+class ColumnarTable:
+    """Memory-mapped Parquet dataset read column- and row-selectively for pandas expressions"""
+
+    def __init__(self, path):
+        self.path = path
+        self.dataset = ds.dataset(path, format="parquet", filesystem=fs.LocalFileSystem(use_mmap=True))
+        self.schema = self.dataset.schema
+        self.column_names = list(self.schema.names)
+        self._summary = None
+
+    @property
+    def summary_path(self):
+        return self.path.rstrip("/\\") + ".summary.json"
+
+    def summary(self):
+        """Prompt description of the table, computed once per version of the data and saved next to it"""
+        if self._summary is not None:
+            return self._summary
+        signature = _signature(self.path)
+        if os.path.exists(self.summary_path):
+            with open(self.summary_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("signature") == signature:
+                self._summary = saved["summary"]
+                return self._summary
+
+        rows, self._summary = summarize(self.dataset)
+        with open(self.summary_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"signature": signature, "rows": rows, "summary": self._summary}, f, indent=2)
+        os.replace(self.summary_path + ".tmp", self.summary_path)
+        return self._summary
+
+    def frame_for(self, tree):
+        """pandas DataFrame holding just what the parsed expression needs"""
+        projection, predicate = plan_scan(tree, self.column_names)
+        try:
+            table = self.dataset.to_table(columns=projection, filter=predicate)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            # e.g. a string column compared with a number: let pandas report (or handle) it
+            table = self.dataset.to_table(columns=projection)
+        return table.to_pandas()
@@ -1,22 +1,278 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
 import pandas as pd
+from llama_index.core.bridge.pydantic import Field
 from llama_index.core.query_engine import CustomQueryEngine
 from llama_index.core.llms import LLM
 from llama_index.llms.ollama import Ollama
 
+# Generated expressions are cached per (normalized query, DataFrame schema), so a
+# repeated question skips the LLM and only re-runs the expression on the data.
+# Before running, an expression is parsed and checked against a whitelist of
+# syntax, names and DataFrame operations; a failing one (invalid, unsafe, error
+# or timeout) is sent back to the LLM with the error, up to MAX_RETRIES times.
+CODE_CACHE_SIZE = int(os.getenv("PANDAS_CODE_CACHE_SIZE", "256"))
+EXEC_TIMEOUT = float(os.getenv("PANDAS_EXEC_TIMEOUT", "5"))  # seconds
+MAX_RETRIES = int(os.getenv("PANDAS_MAX_RETRIES", "2"))
+
+ALLOWED_NODES = (
+    ast.Expression, ast.Constant, ast.Name, ast.Attribute, ast.Subscript, ast.Slice, ast.Call, ast.keyword,
+    ast.Compare, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.IfExp, ast.List, ast.Tuple, ast.Dict, ast.Set,
+    ast.Lambda, ast.arguments, ast.arg, ast.ListComp, ast.GeneratorExp, ast.comprehension,
+    ast.expr_context, ast.operator, ast.cmpop, ast.boolop, ast.unaryop,
+) + ((ast.Index,) if hasattr(ast, "Index") else ())
+
+# DataFrame / Series / pd operations an expression may use (column names are allowed too)
+ALLOWED_ATTRIBUTES = frozenset("""
+    loc iloc at iat head tail nlargest nsmallest sort_values sort_index filter isin between where mask
+    drop dropna fillna reset_index set_index rename astype copy unique nunique value_counts count size shape
+    columns index values dtypes T empty item tolist to_list to_dict to_frame
+    sum mean median min max std var prod quantile idxmax idxmin describe agg aggregate groupby cumsum
+    corr abs round rank pct_change diff clip any all first last apply map
+    isna notna isnull notnull eq ne lt gt le ge add sub mul div
+    str contains startswith endswith lower upper strip replace split len get
+    to_numeric to_datetime concat
+""".split())
+
+SAFE_BUILTINS = {
+    name: __builtins__[name] if isinstance(__builtins__, dict) else getattr(__builtins__, name)
+    for name in ("len", "round", "abs", "min", "max", "sum", "sorted", "list", "dict", "set", "tuple",
+                 "int", "float", "str", "bool", "range", "zip", "enumerate")
+}
+FORBIDDEN_KEYWORDS = {"inplace"}
+
+# pandas resolves a string passed to these as a function ('sum') to the method of that
+# name, so such strings are checked against ALLOWED_ATTRIBUTES as well
+FUNCTION_ARG_METHODS = {"apply", "agg", "aggregate", "map"}
+
+
+class UnsafeExpressionError(ValueError):
+    """Generated code uses syntax or operations outside the whitelist"""
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip(" ?.!")
+
+
+def schema_fingerprint(df):
+    """Hash of the column names and dtypes (the data itself may change under a cached expression)"""
+    schema = [[str(column), str(dtype)] for column, dtype in df.dtypes.items()]
+    return hashlib.sha1(json.dumps(schema).encode("utf-8")).hexdigest()[:16]
+
+
+def arrow_schema_fingerprint(schema):
+    """Same for a pyarrow schema (columnar tables)"""
+    fields = [[field.name, str(field.type)] for field in schema]
+    return hashlib.sha1(json.dumps(fields).encode("utf-8")).hexdigest()[:16]
+
+
+def extract_expression(text):
+    """The expression in an LLM answer (code fences / quotes removed, last line if several)"""
+    text = re.sub(r"```(?:python)?", "", text).strip().strip("`").strip()
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ""
+    whole = " ".join(lines)
+    try:
+        ast.parse(whole, mode="eval")
+        return whole
+    except SyntaxError:
+        return lines[-1]
+
+
+def _check_function_arg(node, method):
+    """Raise UnsafeExpressionError unless node only names allowed functions (or is a lambda / allowed callable)"""
+    if isinstance(node, ast.Constant):
+        # not apply/agg themselves either: agg('apply', 'to_csv') would call df.apply('to_csv')
+        if isinstance(node.value, str) and (node.value not in ALLOWED_ATTRIBUTES
+                                            or node.value in FUNCTION_ARG_METHODS):
+            raise UnsafeExpressionError(f"function '{node.value}' is not allowed in .{method}()")
+    elif isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        for element in node.elts:
+            _check_function_arg(element, method)
+    elif isinstance(node, ast.Dict):
+        # column -> function(s); Series.map takes a dict as a value mapping, not functions
+        if method != "map":
+            for value in node.values:
+                _check_function_arg(value, method)
+    elif isinstance(node, ast.Name):
+        # a lambda / comprehension variable could hold any string
+        if node.id not in SAFE_BUILTINS:
+            raise UnsafeExpressionError(f"'{node.id}' cannot be passed to .{method}()")
+    elif not isinstance(node, (ast.Lambda, ast.Attribute)):
+        raise UnsafeExpressionError(f".{method}() takes a lambda or an allowed function name here")
+
+
+def _function_args(call, method):
+    """The arguments of an apply/agg/aggregate/map call that pandas may treat as functions"""
+    args = call.args[:1] + [keyword.value for keyword in call.keywords if keyword.arg in ("func", "arg")]
+    if method in ("agg", "aggregate"):
+        # named aggregation: agg(total=('column', 'sum'))
+        args += [keyword.value.elts[1] for keyword in call.keywords
+                 if keyword.arg not in ("func", "arg") and isinstance(keyword.value, ast.Tuple)
+                 and len(keyword.value.elts) == 2]
+    return args
+
+
+def validate_expression(tree, columns=()):
+    """Raise UnsafeExpressionError unless every node, name and attribute is whitelisted"""
+    columns = {str(column) for column in columns}
+    local_names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.arg):
+            local_names.add(node.arg)
+        elif isinstance(node, ast.comprehension):
+            local_names.update(n.id for n in ast.walk(node.target) if isinstance(n, ast.Name))
+
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise UnsafeExpressionError(f"{type(node).__name__} is not allowed")
+        if isinstance(node, ast.Name):
+            if node.id not in ("df", "pd") and node.id not in SAFE_BUILTINS and node.id not in local_names:
+                raise UnsafeExpressionError(f"name '{node.id}' is not allowed")
+        elif isinstance(node, ast.Attribute):
+            if node.attr.startswith("_") or (node.attr not in ALLOWED_ATTRIBUTES and node.attr not in columns):
+                raise UnsafeExpressionError(f"attribute '.{node.attr}' is not allowed")
+        elif isinstance(node, ast.keyword):
+            if node.arg is None:
+                raise UnsafeExpressionError("**keyword unpacking is not allowed")
+            if node.arg in FORBIDDEN_KEYWORDS:
+                raise UnsafeExpressionError(f"keyword '{node.arg}' is not allowed")
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                and node.func.attr in FUNCTION_ARG_METHODS:
+            for arg in _function_args(node, node.func.attr):
+                _check_function_arg(arg, node.func.attr)
+
+
+def compile_expression(code, columns=()):
+    """Parse, validate and compile a single pandas expression"""
+    if not code:
+        raise UnsafeExpressionError("no expression was generated")
+    tree = ast.parse(code, mode="eval")
+    validate_expression(tree, columns)
+    return compile(tree, "<pandas query>", "eval")
+
+
+def run_with_timeout(fn, timeout):
+    """fn() in a worker thread; TimeoutError if it takes longer (the thread is left to finish on its own)"""
+    outcome = {}
+
+    def target():
+        try:
+            outcome["value"] = fn()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, name="pandas-query", daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise TimeoutError(f"expression took longer than {timeout:g}s")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
+
+
+class CodeCache:
+    """LRU cache (normalized query, schema) -> compiled expression, optionally saved to a JSON file"""
+
+    def __init__(self, max_entries=CODE_CACHE_SIZE, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (code, compiled or None)
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            # Compiled (and validated again) on first use
+            for key, code in list(saved.items())[-max_entries:] if max_entries > 0 else []:
+                self._entries[key] = (code, None)
+
+    @staticmethod
+    def key(query, fingerprint):
+        return f"{fingerprint}:{normalize_query(query)}"
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, code, compiled):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (code, compiled)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self.save()
+
+    def discard(self, key):
+        with self._lock:
+            removed = self._entries.pop(key, None) is not None
+        if removed:
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            saved = {key: code for key, (code, _) in self._entries.items()}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(saved, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+
 class SimplePandasQueryEngine(CustomQueryEngine):
-    """Simple Pandas query engine."""
-    
-    df: pd.DataFrame
+    """Simple Pandas query engine.
+
+    Runs on an in-memory DataFrame (df) or on a columnar.ColumnarTable (table)
+    that is only read column- and row-selectively for each expression.
+    """
+
+    df: Optional[pd.DataFrame] = None
+    table: Optional[Any] = None  # columnar.ColumnarTable (pyarrow is only needed when used)
     llm: LLM
     instruction_str: str = ""
-    
-    def custom_query(self, query_str: str):
-        """Execute query."""
+    code_cache: CodeCache = Field(default_factory=CodeCache)
+    max_retries: int = MAX_RETRIES
+    timeout: float = EXEC_TIMEOUT
+
+    def _columns(self):
+        return self.table.column_names if self.table is not None else self.df.columns
+
+    def _fingerprint(self):
+        if self.table is not None:
+            return arrow_schema_fingerprint(self.table.schema)
+        return schema_fingerprint(self.df)
+
+    def _describe_data(self):
+        # A columnar table is described by its precomputed column summary, whatever its size
+        if self.table is not None:
+            return self.table.summary()
+        return self.df.head(10).to_string()
+
+    def _prompt(self, query_str, previous_code=None, error=None):
         prompt = f"""
 {self.instruction_str}
 
 Given this dataframe:
-{self.df.head(10).to_string()}
+{self._describe_data()}
 
 Query: {query_str}
 
@@ -24,12 +280,48 @@ Generate Python code using pandas to answer this query.
 Only output the Python expression, no explanation.
 The dataframe variable name is 'df'.
 """
-        response = self.llm.complete(prompt)
-        code = str(response).strip()
-        
-        try:
-            # Execute the pandas code
-            result = eval(code, {"df": self.df, "pd": pd})
+        if error:
+            prompt += f"""
+Your previous expression was:
+{previous_code}
+It failed with: {error}
+Output a corrected expression.
+"""
+        return prompt
+
+    def _execute(self, code, compiled):
+        def run():
+            df = self.table.frame_for(ast.parse(code, mode="eval")) if self.table is not None else self.df
+            return eval(compiled, {"__builtins__": SAFE_BUILTINS, "df": df, "pd": pd})
+
+        return run_with_timeout(run, self.timeout)
+
+    def custom_query(self, query_str: str):
+        """Execute query."""
+        key = self.code_cache.key(query_str, self._fingerprint())
+        cached = self.code_cache.get(key)
+        if cached is not None:
+            code, compiled = cached
+            try:
+                if compiled is None:
+                    compiled = compile_expression(code, self._columns())
+                    self.code_cache.put(key, code, compiled)
+                return str(self._execute(code, compiled))
+            except Exception:
+                # No longer works on the current data: generate it again
+                self.code_cache.discard(key)
+
+        code, error = "", None
+        for _ in range(self.max_retries + 1):
+            response = self.llm.complete(self._prompt(query_str, code, error))
+            code = extract_expression(str(response))
+            try:
+                compiled = compile_expression(code, self._columns())
+                result = self._execute(code, compiled)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+            self.code_cache.put(key, code, compiled)
             return str(result)
-        except Exception as e:
-            return f"Error executing query: {e}\nGenerated code: {code}"
\ No newline at end of file
+
+        return f"Error executing query: {error}\nGenerated code: {code}"
@@ -0,0 +1,116 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for the Scrapeless Google Maps scraper API used by coffee_scraper.py,
+# to try the scraper without an API token:
+#
+#   POST /api/v1/scraper/request  - {"local_results": [...]} for input.q / input.start
+#   GET  /stats                   - requests served so far (and how many failed)
+#
+# Each query has --places deterministic shops around the National Gallery,
+# served 20 per page. --fail-rate answers that share of requests with a 503 to
+# exercise the retries.
+#
+#   python fake_scrapeless.py --port 8765 --latency-ms 300
+#   SCRAPELESS_URL=http://127.0.0.1:8765/api/v1/scraper/request python main.py
+
+PAGE_SIZE = 20
+GALLERY = (45.4299, -75.6939)
+
+
+def fake_places(query, count):
+    """The same shops for the same query every time"""
+    seed = int.from_bytes(hashlib.blake2b(query.encode("utf-8"), digest_size=8).digest(), "little")
+    rng = random.Random(seed)
+    places = []
+    for i in range(count):
+        places.append({
+            "place_id": f"{query}-{i}",
+            "title": f"{query.title()} Shop {i}",
+            "address": f"{rng.randint(1, 999)} {rng.choice(['Sussex Dr', 'Rideau St', 'Bank St', 'Elgin St'])}",
+            "price": "$" * rng.randint(1, 3),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "gps_coordinates": {"latitude": GALLERY[0] + rng.uniform(-0.02, 0.02),
+                                "longitude": GALLERY[1] + rng.uniform(-0.02, 0.02)},
+        })
+    return places
+
+
+class FakeScrapelessHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    settings = None  # argparse.Namespace, set by make_server
+    stats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.stats["lock"]:
+                self._send_json(200, {key: value for key, value in self.stats.items() if key != "lock"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.stats["lock"]:
+            self.stats["requests"] += 1
+            fail = random.random() < self.settings.fail_rate
+            if fail:
+                self.stats["failed"] += 1
+        time.sleep(self.settings.latency_ms / 1000)
+
+        if self.path != "/api/v1/scraper/request":
+            self._send_json(404, {"error": "not found"})
+        elif not self.headers.get("x-api-token") and self.settings.require_token:
+            self._send_json(401, {"error": "missing x-api-token"})
+        elif fail:
+            self._send_json(503, {"error": "try again"})
+        else:
+            params = body.get("input", {})
+            start = int(params.get("start") or 0)
+            places = fake_places(params.get("q", ""), self.settings.places)
+            self._send_json(200, {"local_results": places[start:start + PAGE_SIZE]})
+
+
+def make_server(host="127.0.0.1", port=8765, latency_ms=300.0, places=45, fail_rate=0.0, require_token=False):
+    """HTTP server answering like the Scrapeless API (call serve_forever, or run it in a thread)"""
+    settings = argparse.Namespace(latency_ms=latency_ms, places=places, fail_rate=fail_rate,
+                                  require_token=require_token)
+    stats = {"requests": 0, "failed": 0, "lock": threading.Lock()}
+    handler = type("ConfiguredFakeScrapelessHandler", (FakeScrapelessHandler,), {"settings": settings, "stats": stats})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Scrapeless API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="delay per request")
+    parser.add_argument("--places", type=int, default=45, help="shops per query")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--require-token", action="store_true", help="answer 401 without an x-api-token header")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.places, args.fail_rate, args.require_token)
+    print(f"✅ Fake Scrapeless API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,70 +1,360 @@
+import argparse
+import importlib
 import os
-import pandas as pd
-from custom_pandas_engine import SimplePandasQueryEngine
-from prompts import instruction_str
-from note_engine import note_engine
-from llama_index.core.tools import QueryEngineTool, ToolMetadata, FunctionTool
-from llama_index.llms.ollama import Ollama
-from pdf import canada_engine
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Only the standard library is imported up front: llama_index, pandas and the
+# PDF index take seconds to load, so each engine imports what it needs the first
+# time route_query picks it (or when it is pre-warmed in the background).
+STARTED_AT = time.perf_counter()
+
+# --------------------------
+# STARTUP PROFILE
+# --------------------------
+# (kind, name, seconds) for every deferred import and engine construction
+timings = []
+timings_lock = threading.Lock()
+
+
+def record_timing(kind, name, seconds):
+    with timings_lock:
+        timings.append((kind, name, seconds))
+
+
+def load_module(name):
+    """Import a module on first use, timing it (already imported modules cost nothing)"""
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    record_timing("import", name, time.perf_counter() - start)
+    return module
+
+
+def print_profile():
+    print("\n=== Startup profile ===")
+    with timings_lock:
+        rows = list(timings)
+    for kind, name, seconds in rows:
+        print(f"  {kind:<7} {name:<26} {seconds * 1000:8.1f} ms")
+    print("  (an import's time includes the modules it pulls in that were not loaded yet)\n")
+
+
+# --------------------------
+# ENGINE REGISTRY
+# --------------------------
+class EngineRegistry:
+    """Engines created on first use; each is built once, even when asked for from several threads"""
+
+    def __init__(self):
+        self._factories = {}
+        self._engines = {}
+        self._locks = {}
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def names(self):
+        return list(self._factories)
+
+    def get(self, name):
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+        with self._locks[name]:
+            if name not in self._engines:
+                start = time.perf_counter()
+                self._engines[name] = self._factories[name]()
+                record_timing("init", name, time.perf_counter() - start)
+            return self._engines[name]
+
+    def prewarm(self, names):
+        """Build engines in a background thread; a query needing one that is still building waits for it"""
+        def warm():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    # Not fatal: the engine will be built (and fail visibly) on its first query
+                    print(f"\n⚠️ Could not pre-warm {name}: {e}")
+
+        thread = threading.Thread(target=warm, name="prewarm", daemon=True)
+        thread.start()
+        return thread
+
+
+engines = EngineRegistry()
+
 
 # --------------------------
 # LLM SETUP
 # --------------------------
-llm = Ollama(
-    model="llama3.2:1b", 
-    request_timeout=120.0,
-    system_prompt="You are a helpful assistant. Provide direct, concise answers without conversational extras. Answer only what is asked."  # ✅ ADD THIS
-)
+def build_llm():
+    Ollama = load_module("llama_index.llms.ollama").Ollama
+    return Ollama(
+        model="llama3.2:1b",
+        request_timeout=120.0,
+        system_prompt="You are a helpful assistant. Provide direct, concise answers without conversational extras. Answer only what is asked."  # ✅ ADD THIS
+    )
+
 
 # --------------------------
 # POPULATION DATA
 # --------------------------
-population_path = os.path.join("data", "population.csv")
-population_df = pd.read_csv(population_path)
+# POPULATION_BACKEND=columnar keeps the data in a memory-mapped Parquet file
+# (converted once from a CSV under storage/) instead of a DataFrame in RAM, for
+# extracts too large to load. POPULATION_DATA can point at a .csv or .parquet.
+POPULATION_DATA = os.getenv("POPULATION_DATA", os.path.join("data", "population.csv"))
+POPULATION_BACKEND = os.getenv("POPULATION_BACKEND", "pandas")
+
+
+def load_population_table(path):
+    columnar = load_module("columnar")
+    if path.lower().endswith(".csv"):
+        csv_path = path
+        storage = os.getenv("AGENT_STORAGE_DIR", "storage")
+        path = os.path.join(storage, os.path.splitext(os.path.basename(csv_path))[0] + ".parquet")
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(csv_path):
+            print(f"🔹 Converting {csv_path} to Parquet...")
+            columnar.csv_to_parquet(csv_path, path)
+    return columnar.ColumnarTable(path)
+
+
+def build_population_engine():
+    custom_pandas_engine = load_module("custom_pandas_engine")
+    instruction_str = load_module("prompts").instruction_str
+
+    if POPULATION_BACKEND == "columnar":
+        data = {"table": load_population_table(POPULATION_DATA)}
+    else:
+        pd = load_module("pandas")
+        data = {"df": pd.read_csv(POPULATION_DATA)}
+
+    # Generated pandas expressions are kept across runs, so repeated questions skip the LLM
+    code_cache = custom_pandas_engine.CodeCache(
+        path=os.path.join(os.getenv("AGENT_STORAGE_DIR", "storage"), "population_code_cache.json")
+    )
+
+    return custom_pandas_engine.SimplePandasQueryEngine(
+        llm=engines.get("llm"),
+        instruction_str=instruction_str,
+        code_cache=code_cache,
+        **data
+    )
+
+
+# --------------------------
+# CANADA PDF / NOTES
+# --------------------------
+def build_canada_engine():
+    # Loads the persisted index (only new / changed PDFs are embedded, see pdf.py)
+    return load_module("pdf").canada_engine.get()
+
+
+def build_note_saver():
+    # save_note itself needs no llama_index import (the FunctionTool is built lazily)
+    return load_module("note_engine").save_note
+
+
+# NOTE_SEMANTIC_SEARCH=1 also ranks notes by embedding similarity (not just shared words)
+NOTE_SEMANTIC_SEARCH = os.getenv("NOTE_SEMANTIC_SEARCH", "0") == "1"
+
+
+def build_note_search():
+    note_engine = load_module("note_engine")
+    if NOTE_SEMANTIC_SEARCH:
+        OllamaEmbedding = load_module("llama_index.embeddings.ollama").OllamaEmbedding
+        embed_model = OllamaEmbedding(model_name=ROUTER_EMBED_MODEL)
+        note_engine.get_note_store().embed_texts = embed_model.get_text_embedding_batch
+    # search_notes FunctionTool, registered next to note_saver
+    return note_engine.search_notes_engine
+
+
+# --------------------------
+# SEMANTIC ROUTER
+# --------------------------
+# Example questions per route; their mean embedding is the route's centroid.
+# Edit freely: centroids are recomputed when these change.
+ROUTE_EXAMPLES = {
+    "population": [
+        "What is the population of India?",
+        "Which country has the most people?",
+        "List the 5 most densely populated countries",
+        "What is the median age in Japan?",
+        "Which countries have a fertility rate below 1.5?",
+        "Compare the urban population share of France and Germany",
+        "How many migrants did the United States receive?",
+    ],
+    "canada": [
+        "What is the capital of Canada?",
+        "Tell me about the history of Canada",
+        "What languages are spoken in Canada?",
+        "How is the Canadian government organized?",
+        "What are the provinces and territories of Canada?",
+        "Describe the geography and climate of Canada",
+    ],
+    "note_search": [
+        "What did I note about the meeting?",
+        "Find my notes on groceries",
+        "Did I save anything about my passport?",
+        "Show my notes mentioning Paris",
+        "What was in my note about the project deadline?",
+    ],
+    "llm": [
+        "Write a short poem about the sea",
+        "Explain how a neural network works",
+        "What is 17 times 23?",
+        "Give me a recipe for pancakes",
+        "Translate 'good morning' into Spanish",
+        "What is the difference between a list and a tuple in Python?",
+    ],
+}
+ROUTER_EMBED_MODEL = os.getenv("ROUTER_EMBED_MODEL", "nomic-embed-text")
+# Also run the runner-up engine when the two best routes score within ROUTER_MARGIN,
+# and answer with whichever gives a usable answer first
+PARALLEL_ROUTES = os.getenv("ROUTER_PARALLEL", "0") == "1"
+
+
+def build_router():
+    OllamaEmbedding = load_module("llama_index.embeddings.ollama").OllamaEmbedding
+    router = load_module("router")
+    embed_model = OllamaEmbedding(model_name=ROUTER_EMBED_MODEL)
+    return router.SemanticRouter(
+        embed_query=embed_model.get_query_embedding,
+        embed_texts=embed_model.get_text_embedding_batch,
+        routes=ROUTE_EXAMPLES,
+        model_name=ROUTER_EMBED_MODEL,
+        centroids_path=os.path.join(os.getenv("AGENT_STORAGE_DIR", "storage"), "router_centroids.json"),
+        fallback="llm"
+    )
+
+
+engines.register("router", build_router)
+engines.register("llm", build_llm)
+engines.register("population", build_population_engine)
+engines.register("canada", build_canada_engine)
+engines.register("notes", build_note_saver)
+engines.register("note_search", build_note_search)
+
+route_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="route")
 
-population_query_engine = SimplePandasQueryEngine(
-    df=population_df,
-    llm=llm,
-    instruction_str=instruction_str
-)
 
 # --------------------------
 # SIMPLE AGENT (without ReActAgent)
 # --------------------------
+def keyword_routes(query):
+    """Substring routing, used when the embedding model is unavailable"""
+    query_lower = query.lower()
+    if any(word in query_lower for word in ["population", "people", "demographic", "country"]):
+        return ["population"]
+    if "canada" in query_lower or "canadian" in query_lower:
+        return ["canada"]
+    if "note" in query_lower:
+        return ["note_search"]
+    return ["llm"]
+
+
+def pick_routes(query):
+    try:
+        # Building the router and embedding the query both need the embedding model
+        return engines.get("router").routes_for(query, allow_second=PARALLEL_ROUTES)
+    except Exception:
+        return keyword_routes(query)
+
+
+def run_route(name, query):
+    if name == "llm":
+        response = engines.get("llm").complete(query)
+        return str(response).strip()  # ✅ ADD .strip() to remove extra whitespace
+    if name == "note_search":
+        return engines.get("note_search").fn(query)
+    result = engines.get(name).query(query)
+    return str(result)
+
+
+def is_good_answer(answer):
+    return bool(answer.strip()) and not answer.startswith("Error") and answer.strip() != "Empty Response"
+
+
+def first_good_answer(routes, query):
+    """Run the engines side by side; the first usable answer wins (else the best route's answer)"""
+    futures = {route_pool.submit(run_route, name, query): name for name in routes}
+    answers = {}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                answers[futures[future]] = future.result()
+            except Exception as e:
+                answers[futures[future]] = f"Error: {e}"
+            if is_good_answer(answers[futures[future]]):
+                # The other engine finishes in the background; its answer is dropped
+                return answers[futures[future]]
+    return answers[routes[0]]
+
+
 def route_query(query: str) -> str:
-    """Route queries to appropriate tools."""
+    """Route queries to appropriate tools (only the chosen engine gets built)."""
     query_lower = query.lower()
-    
-    # Check for note saving
+
+    # Check for note saving (an explicit command: it writes, so it is never guessed)
     if "save note" in query_lower or "remember" in query_lower:
         note_content = query.replace("save note", "").replace("remember", "").strip()
-        return note_engine.fn(note_content)
-    
-    # Check for population queries
-    elif any(word in query_lower for word in ["population", "people", "demographic", "country"]):
-        result = population_query_engine.query(query)
-        return str(result)
-    
-    # Check for Canada queries
-    elif "canada" in query_lower or "canadian" in query_lower:
-        result = canada_engine.query(query)
-        return str(result)
-    
-    # Default to asking LLM
-    else:
-        response = llm.complete(query)
-        return str(response).strip()  # ✅ ADD .strip() to remove extra whitespace
+        return engines.get("notes")(note_content)
+
+    # Population data, the Canada PDF or the plain LLM, by meaning
+    routes = pick_routes(query)
+    if len(routes) == 1:
+        return run_route(routes[0], query)
+    return first_good_answer(routes, query)
+
 
 # --------------------------
 # INTERACTIVE PROMPT
 # --------------------------
-print("=== Local RAG System using Ollama ===")
-print("Ask about population data, Canada, or save notes!")
-print("Type 'q' to quit.\n")
+def main():
+    parser = argparse.ArgumentParser(description="Local RAG agent using Ollama")
+    parser.add_argument("--prewarm", nargs="?", const=",".join(engines.names()),
+                        default=os.getenv("AGENT_PREWARM", ""),
+                        help="Engines to build in the background once the prompt is shown "
+                             "(comma-separated; all of them if no value is given)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Build every engine up front and report each module's import and engine's init time")
+    args = parser.parse_args()
 
-while (prompt := input("Enter a question: ")) != "q":
-    try:
-        result = route_query(prompt)
-        print(f"\n{result}\n")  # ✅ SIMPLIFIED: Remove "=== RESPONSE ===" wrapper
-    except Exception as e:
-        print(f"Error: {e}\n")
\ No newline at end of file
+    prewarm = [name.strip() for name in args.prewarm.split(",") if name.strip()]
+    unknown = [name for name in prewarm if name not in engines.names()]
+    if unknown:
+        parser.error(f"unknown engine(s) {', '.join(unknown)}; choose from {', '.join(engines.names())}")
+
+    if args.profile_startup:
+        record_timing("ready", "prompt", time.perf_counter() - STARTED_AT)
+        for name in engines.names():
+            try:
+                engines.get(name)
+            except Exception as e:
+                print(f"⚠️ {name}: {e}")
+        print_profile()
+
+    print("=== Local RAG System using Ollama ===")
+    print("Ask about population data, Canada, or save and search notes!")
+    print("Type 'q' to quit.\n")
+
+    if prewarm:
+        engines.prewarm(prewarm)
+
+    while (prompt := input("Enter a question: ")) != "q":
+        try:
+            result = route_query(prompt)
+            print(f"\n{result}\n")  # ✅ SIMPLIFIED: Remove "=== RESPONSE ===" wrapper
+        except Exception as e:
+            print(f"Error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
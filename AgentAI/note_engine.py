@@ -1,19 +1,188 @@
-from llama_index.core.tools import FunctionTool
+import atexit
+import math
 import os
+import re
+import threading
 
 note_file = os.path.join("data", "notes.txt")
 
-def save_note(note):
-    if not os.path.exists(note_file):
-        open(note_file, "w").close()
+# Notes are kept in an append-only log (one note per line in note_file) written
+# through a buffered file handle that stays open; a background thread flushes
+# and fsyncs it every NOTE_FSYNC_SECONDS (and at exit), so a crash loses at most
+# that much. The log is read once, on first use, into memory and an inverted
+# index (word -> note ids) that every new note updates, so saving is O(1) and
+# searching only touches the notes sharing a word with the query.
+# An embedding function can be given to also rank notes by meaning; notes are
+# embedded in batches when a search needs them, not when saved.
+NOTE_FSYNC_SECONDS = float(os.getenv("NOTE_FSYNC_SECONDS", "1.0"))
+
+_WORD_RE = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i in is it its me my of on or that the this "
+    "to was were what when where which who why will with you your about did".split()
+)
+
+
+def tokenize(text):
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+class NoteStore:
+    """Append-only note log with an in-memory inverted index (and optional embedding index)"""
+
+    def __init__(self, path=note_file, fsync_seconds=NOTE_FSYNC_SECONDS, embed_texts=None):
+        self.path = path
+        self.embed_texts = embed_texts
+        self.notes = []
+        self.index = {}  # word -> set of note ids
+        self._vectors = None  # unit embeddings of the first len(_vectors) notes (numpy matrix)
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index_note(line.rstrip("\n"))
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=64 * 1024)
+
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, args=(fsync_seconds,), name="note-fsync",
+                                         daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _index_note(self, text):
+        note_id = len(self.notes)
+        self.notes.append(text)
+        for word in set(tokenize(text)):
+            self.index.setdefault(word, set()).add(note_id)
+        return note_id
+
+    # ----------------- Writing -----------------
+    def add(self, text):
+        """Append a note (one line in the log); returns its id"""
+        text = " ".join(text.split())  # one note per line
+        with self._lock:
+            self._file.write(text + "\n")
+            self._dirty = True
+            return self._index_note(text)
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty or self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _flush_loop(self, interval):
+        while not self._closed.wait(interval):
+            self.flush()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self.flush()
+        with self._lock:
+            self._file.close()
+
+    # ----------------- Searching -----------------
+    def search(self, query, k=5):
+        """Best matching notes, best first: lexical (idf-weighted shared words), fused with semantic if enabled"""
+        ranked = self._lexical(query)
+        if self.embed_texts is not None:
+            ranked = _fuse(ranked[:k * 10], self._semantic(query, k * 10))
+        return [self.notes[note_id] for note_id in ranked[:k]]
 
-    with open(note_file, "a") as f:
-        f.writelines([note + "\n"])
+    def _lexical(self, query):
+        with self._lock:
+            total = len(self.notes)
+            scores = {}
+            for word in set(tokenize(query)):
+                postings = self.index.get(word, ())
+                weight = math.log(1 + total / len(postings)) if postings else 0
+                for note_id in postings:
+                    scores[note_id] = scores.get(note_id, 0) + weight
+        # Equal scores: the newest note first
+        return sorted(scores, key=lambda note_id: (-scores[note_id], -note_id))
 
+    def _semantic(self, query, limit):
+        import numpy as np
+
+        with self._lock:
+            start = 0 if self._vectors is None else len(self._vectors)
+            missing = self.notes[start:]
+        if missing:
+            vectors = np.asarray(self.embed_texts(missing), dtype=np.float32)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            with self._lock:
+                if (0 if self._vectors is None else len(self._vectors)) == start:  # not done by a concurrent search
+                    self._vectors = vectors if self._vectors is None else np.vstack([self._vectors, vectors])
+        # Score a snapshot: row i is note id i, so the ids scored are exactly 0..len(vectors)-1
+        # even if another search replaces self._vectors meanwhile
+        with self._lock:
+            vectors = self._vectors
+        if vectors is None:
+            return []
+        query_vector = np.asarray(self.embed_texts([query])[0], dtype=np.float32)
+        scores = vectors @ (query_vector / max(np.linalg.norm(query_vector), 1e-12))
+        top = np.argpartition(-scores, limit - 1)[:limit] if len(scores) > limit else np.arange(len(scores))
+        return [int(i) for i in top[np.argsort(-scores[top])]]
+
+
+def _fuse(*rankings, k=60):
+    """Reciprocal rank fusion of several rankings of note ids"""
+    scores = {}
+    for ranking in rankings:
+        for rank, note_id in enumerate(ranking):
+            scores[note_id] = scores.get(note_id, 0) + 1 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_note_store():
+    """The shared store for note_file, opened (and indexed) on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = NoteStore(note_file)
+        return _store
+
+
+def save_note(note):
+    get_note_store().add(note)
     return "Note saved!"
 
-note_engine = FunctionTool.from_defaults(
-    fn=save_note,
-    name="note_saver",
-    description="Saves a text note to a file for the user."
-)
+
+def search_notes(query, k=5):
+    notes = get_note_store().search(query, k=k)
+    if not notes:
+        return "No matching notes."
+    return "\n".join(f"- {note}" for note in notes)
+
+
+def __getattr__(name):
+    # The FunctionTools (and llama_index with them) are only built when first asked for,
+    # so main.py can save notes without paying for the llama_index import
+    if name in ("note_engine", "search_notes_engine"):
+        from llama_index.core.tools import FunctionTool
+
+        globals()["note_engine"] = FunctionTool.from_defaults(
+            fn=save_note,
+            name="note_saver",
+            description="Saves a text note to a file for the user."
+        )
+        globals()["search_notes_engine"] = FunctionTool.from_defaults(
+            fn=search_notes,
+            name="search_notes",
+            description="Finds the user's saved notes most relevant to a query."
+        )
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
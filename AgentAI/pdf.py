@@ -1,11 +1,50 @@
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
+import hashlib
+import json
+import os
+import threading
+
+from llama_index.core import SimpleDirectoryReader, StorageContext, VectorStoreIndex, load_index_from_storage
 from llama_index.core.node_parser import SimpleNodeParser
 from llama_index.embeddings.ollama import OllamaEmbedding
 from llama_index.llms.ollama import Ollama
 
-def get_index(pdf_path, name):
-    # 1️⃣ Load documents
-    documents = SimpleDirectoryReader(input_files=[pdf_path]).load_data()
+# The index is persisted under STORAGE_DIR/<name> together with a small
+# manifest of the PDFs it was built from (path -> SHA-256, document ids).
+# On start it is loaded from disk; only PDFs that are new or whose hash
+# changed are parsed and embedded, and PDFs that were removed from the
+# list are deleted from the index.
+STORAGE_DIR = os.getenv("AGENT_STORAGE_DIR", "storage")
+MANIFEST_FILE = "sources.json"
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_manifest(persist_dir):
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(persist_dir, manifest):
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _load_nodes(pdf_path):
+    """Parse a PDF into (document ids, nodes)"""
+    # 1️⃣ Load documents (ids derived from the file name, one per page)
+    documents = SimpleDirectoryReader(input_files=[pdf_path], filename_as_id=True).load_data()
 
     # 2️⃣ Create a node parser to split documents into chunks
     parser = SimpleNodeParser(
@@ -15,30 +54,88 @@ def get_index(pdf_path, name):
 
     # 3️⃣ Convert documents into nodes (pre-chunked)
     nodes = parser.get_nodes_from_documents(documents)
+    return [doc.doc_id for doc in documents], nodes
+
+
+def get_index(pdf_paths, name):
+    """Vector index over some PDFs, loaded from STORAGE_DIR and updated only for PDFs that changed"""
+    if isinstance(pdf_paths, str):
+        pdf_paths = [pdf_paths]
+    persist_dir = os.path.join(STORAGE_DIR, name)
 
     # 4️⃣ Ollama embeddings
     embed_model = OllamaEmbedding(
         model_name="nomic-embed-text"
     )
 
-    # 5️⃣ Create index
-    index = VectorStoreIndex.from_documents(
-        nodes,
-        embed_model=embed_model,
-        show_progress=True
-    )
+    manifest = _read_manifest(persist_dir)
+    wanted = {os.path.abspath(path): file_hash(path) for path in pdf_paths}
+    changed = [path for path, digest in wanted.items() if manifest.get(path, {}).get("hash") != digest]
+    removed = [path for path in manifest if path not in wanted]
+
+    if manifest and os.path.exists(os.path.join(persist_dir, "docstore.json")):
+        index = load_index_from_storage(
+            StorageContext.from_defaults(persist_dir=persist_dir),
+            embed_model=embed_model
+        )
+        if not changed and not removed:
+            return index
+    else:
+        index = VectorStoreIndex([], embed_model=embed_model)
+        manifest = {}
+        changed = list(wanted)
 
-    # 6️⃣ Create LLM for query engine ✅ ADD THIS
-    # In the get_index function, change the LLM line to:
+    # Drop the old version of changed PDFs and the PDFs no longer listed
+    for path in changed + removed:
+        for doc_id in manifest.pop(path, {}).get("doc_ids", []):
+            index.delete_ref_doc(doc_id, delete_from_docstore=True)
+
+    # 5️⃣ Embed only the new / changed PDFs (nodes are inserted as-is, not re-split)
+    for path in changed:
+        print(f"🔹 Indexing {os.path.basename(path)}...")
+        doc_ids, nodes = _load_nodes(path)
+        index.insert_nodes(nodes, show_progress=True)
+        manifest[path] = {"hash": wanted[path], "doc_ids": doc_ids}
+
+    os.makedirs(persist_dir, exist_ok=True)
+    index.storage_context.persist(persist_dir=persist_dir)
+    _write_manifest(persist_dir, manifest)
+    return index
+
+
+def get_query_engine(pdf_paths, name):
+    index = get_index(pdf_paths, name)
+
+    # 6️⃣ Create LLM for query engine
     llm = Ollama(
-    model="llama3.2:1b", 
+    model="llama3.2:1b",
     request_timeout=120.0,
     system_prompt="Provide direct, concise answers based on the context. No conversational extras."
-    )   
-    
-    # 7️⃣ Return query engine with Ollama LLM ✅ FIX THIS
+    )
+
+    # 7️⃣ Return query engine with Ollama LLM
     return index.as_query_engine(llm=llm)
 
 
-# Create the query engine
-canada_engine = get_index("data/canada.pdf", "canada")
\ No newline at end of file
+class LazyQueryEngine:
+    """Query engine built on its first query (loading or updating the persisted index then)"""
+
+    def __init__(self, pdf_paths, name):
+        self.pdf_paths = pdf_paths
+        self.name = name
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._engine is None:
+                self._engine = get_query_engine(self.pdf_paths, self.name)
+            return self._engine
+
+    def query(self, query):
+        return self.get().query(query)
+
+
+# Query engine for the Canada PDF, created on the first Canada question.
+# Add more PDFs to the list to index them too (only the new ones get embedded).
+canada_engine = LazyQueryEngine(["data/Canada.pdf"], "canada")
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Routes a query to a tool by meaning instead of keywords: every route is
+# described by a few example questions whose embeddings are averaged into one
+# unit centroid (computed once, then loaded from CENTROIDS_FILE). A query is
+# embedded once and scored against all centroids with a single matrix product;
+# the ranking is kept in an LRU cache, so a repeated question is routed without
+# calling the embedding model at all.
+ROUTER_CACHE_SIZE = int(os.getenv("ROUTER_CACHE_SIZE", "1024"))
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.03"))        # top two closer than this = ambiguous
+ROUTER_MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", "0.0"))   # below this, use the fallback route
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def _unit(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class SemanticRouter:
+    """Nearest-centroid query router with an LRU cache of decisions"""
+
+    def __init__(self, embed_query, embed_texts, routes, model_name="", centroids_path=None,
+                 fallback=None, cache_size=ROUTER_CACHE_SIZE, margin=ROUTER_MARGIN, min_score=ROUTER_MIN_SCORE):
+        """routes: name -> example questions; embed_query(text) / embed_texts(texts) return vectors"""
+        self.embed_query = embed_query
+        self.names = list(routes)
+        self.fallback = fallback
+        self.cache_size = cache_size
+        self.margin = margin
+        self.min_score = min_score
+        self.hits = 0
+        self.misses = 0
+        self._decisions = OrderedDict()  # normalized query -> [(name, score), ...] best first
+        self._lock = threading.Lock()
+        self.centroids = self._load_centroids(embed_texts, routes, model_name, centroids_path)
+
+    def _load_centroids(self, embed_texts, routes, model_name, path):
+        """(routes x dim) matrix of unit centroids, recomputed only when the examples or the model change"""
+        digest = hashlib.sha256(json.dumps([model_name, routes], sort_keys=True).encode("utf-8")).hexdigest()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("digest") == digest:
+                return _unit([saved["centroids"][name] for name in self.names])
+
+        examples = [example for name in self.names for example in routes[name]]
+        vectors = _unit(embed_texts(examples))
+        centroids, start = [], 0
+        for name in self.names:
+            count = len(routes[name])
+            centroids.append(vectors[start:start + count].mean(axis=0))
+            start += count
+        centroids = _unit(centroids)
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"digest": digest, "model": model_name,
+                           "centroids": {name: centroid.tolist() for name, centroid in zip(self.names, centroids)}}, f)
+            os.replace(path + ".tmp", path)
+        return centroids
+
+    def rank(self, query):
+        """[(route, cosine similarity), ...] best first"""
+        key = normalize_query(query)
+        with self._lock:
+            ranking = self._decisions.get(key)
+            if ranking is not None:
+                self._decisions.move_to_end(key)
+                self.hits += 1
+                return ranking
+            self.misses += 1
+
+        scores = self.centroids @ _unit(self.embed_query(query))
+        order = np.argsort(-scores)
+        ranking = [(self.names[i], float(scores[i])) for i in order]
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._decisions[key] = ranking
+                while len(self._decisions) > self.cache_size:
+                    self._decisions.popitem(last=False)
+        return ranking
+
+    def routes_for(self, query, allow_second=False):
+        """The best route, plus the runner-up when it is within the margin and allow_second is set"""
+        ranking = self.rank(query)
+        (best, best_score), rest = ranking[0], ranking[1:]
+        if best_score < self.min_score and self.fallback:
+            return [self.fallback]
+        if allow_second and rest and best_score - rest[0][1] < self.margin:
+            return [best, rest[0][0]]
+        return [best]
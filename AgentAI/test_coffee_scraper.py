@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+
+import pytest
+import requests
+
+import coffee_scraper
+from coffee_scraper import CoffeeScraper, ResponseCache, make_session
+from fake_scrapeless import make_server
+
+PLACES = 45  # 3 pages of 20
+PAGES = 3
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    server = make_server(port=0, latency_ms=0, places=PLACES)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(coffee_scraper, "SCRAPELESS_URL", base_url + "/api/v1/scraper/request")
+    yield server, base_url
+    server.shutdown()
+    server.server_close()
+
+
+def requests_served(base_url):
+    return requests.get(base_url + "/stats").json()["requests"]
+
+
+def fail_every_request(server):
+    server.RequestHandlerClass.settings.fail_rate = 1.0
+
+
+def new_scraper(cache_dir):
+    scraper = CoffeeScraper()
+    scraper.cache = ResponseCache(str(cache_dir), ttl=3600)
+    scraper.session = make_session(retries=0)  # one request per page, so the counts are exact
+    return scraper
+
+
+def expire(cache_dir, count=None):
+    """Backdate cached pages (all of them, or the first `count`) past any ttl"""
+    for name in sorted(os.listdir(cache_dir))[:count]:
+        path = os.path.join(cache_dir, name)
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        entry["fetched_at"] -= 10 ** 6
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+
+
+def test_cold_fetch_sends_one_request_per_page(fake_api, tmp_path):
+    _, base_url = fake_api
+    scraper = new_scraper(tmp_path)
+
+    places = scraper.fetch_places(pages=PAGES)
+
+    assert requests_served(base_url) == PAGES
+    assert scraper.requests_sent == PAGES
+    assert len(places) == PLACES
+    assert len(os.listdir(tmp_path)) == PAGES
+
+
+def test_warm_fetch_sends_no_request(fake_api, tmp_path):
+    _, base_url = fake_api
+    cold = new_scraper(tmp_path).fetch_places(pages=PAGES)
+
+    scraper = new_scraper(tmp_path)
+    warm = scraper.fetch_places(pages=PAGES)
+
+    assert scraper.requests_sent == 0
+    assert requests_served(base_url) == PAGES
+    assert warm == cold
+
+
+def test_expired_page_is_refetched(fake_api, tmp_path):
+    _, base_url = fake_api
+    new_scraper(tmp_path).fetch_places(pages=PAGES)
+    expire(tmp_path, count=1)
+
+    scraper = new_scraper(tmp_path)
+    places = scraper.fetch_places(pages=PAGES)
+
+    assert scraper.requests_sent == 1
+    assert requests_served(base_url) == PAGES + 1
+    assert len(places) == PLACES
+
+
+def test_expired_page_is_used_when_refresh_fails(fake_api, tmp_path):
+    server, base_url = fake_api
+    cold = new_scraper(tmp_path).fetch_places(pages=PAGES)
+    expire(tmp_path)
+    fail_every_request(server)
+
+    scraper = new_scraper(tmp_path)
+    places = scraper.fetch_places(pages=PAGES)
+
+    assert scraper.requests_sent == PAGES
+    assert requests_served(base_url) == 2 * PAGES
+    assert places == cold
+
+
+def test_failed_page_keeps_the_other_pages(fake_api, tmp_path):
+    server, _ = fake_api
+    new_scraper(tmp_path).fetch_places(pages=PAGES - 1)  # the last page is never cached
+    fail_every_request(server)
+
+    scraper = new_scraper(tmp_path)
+    places = scraper.fetch_places(pages=PAGES)
+    scraper.scrape_nearby_coffee(pages=PAGES)
+
+    assert len(places) == 2 * coffee_scraper.PAGE_SIZE
+    assert len(scraper.df) == 2 * coffee_scraper.PAGE_SIZE
+    assert scraper.df["distance_km"].notna().all()
+
+
+def test_fetch_fails_when_every_page_fails(fake_api, tmp_path):
+    server, _ = fake_api
+    fail_every_request(server)
+
+    with pytest.raises(Exception, match="Scraping failed"):
+        new_scraper(tmp_path).fetch_places(pages=PAGES)
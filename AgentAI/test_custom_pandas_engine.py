@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from custom_pandas_engine import SAFE_BUILTINS, UnsafeExpressionError, compile_expression
+
+COLUMNS = ["a", "b"]
+
+
+@pytest.mark.parametrize("code", [
+    # pandas calls the method named by a string argument, so these would write a file
+    "df.agg('to_csv', path_or_buf={path!r})",
+    "df.apply('to_csv', path_or_buf={path!r})",
+    "df['a'].agg('to_csv', path_or_buf={path!r})",
+    "df.aggregate('to_csv', path_or_buf={path!r})",
+    "df['a'].map('to_csv')",
+    "df.agg(func='to_csv', path_or_buf={path!r})",
+    "df.aggregate(['sum', 'to_csv'], path_or_buf={path!r})",
+    "df.apply({{'a': 'to_csv'}})",
+    "df.agg({{'a': ['sum', 'to_csv']}})",
+    "df.groupby('a').agg(x=('b', 'to_csv'))",
+    "df.agg('apply', 'to_csv', path_or_buf={path!r})",
+    "df.agg(**{{'func': 'to_csv', 'path_or_buf': {path!r}}})",
+    "[df.agg(name, path_or_buf={path!r}) for name in ['to_csv']]",
+    "df.to_string({path!r})",
+])
+def test_string_function_arguments_are_rejected(code, tmp_path):
+    path = str(tmp_path / "leak.csv")
+    code = code.format(path=path)
+    with pytest.raises(UnsafeExpressionError):
+        compile_expression(code, COLUMNS)
+
+
+@pytest.mark.parametrize("code", [
+    "df.agg('sum')",
+    "df.agg(['sum', 'max'])",
+    "df.agg({'a': 'sum', 'b': ['min', 'max']})",
+    "df['a'].apply(lambda x: x * 2).tolist()",
+    "df.apply(pd.to_numeric, errors='coerce')",
+    "df['a'].map({1: 'one', 2: 'two'})",
+    "df['a'].map(str)",
+    "df.groupby('a').agg(total=('b', 'sum'))",
+])
+def test_allowed_expressions_still_run(code):
+    df = pd.DataFrame({"a": [1, 2], "b": [3, 4]})
+    compiled = compile_expression(code, COLUMNS)
+    eval(compiled, {"__builtins__": SAFE_BUILTINS, "df": df, "pd": pd})
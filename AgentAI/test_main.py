@@ -0,0 +1,27 @@
+import main
+from router import SemanticRouter
+
+ROUTES = {"population": ["How many people live in India?"], "llm": ["Write a poem"]}
+
+
+def unavailable(*args):
+    raise ConnectionError("embedding model is not running")
+
+
+def test_router_failure_falls_back_to_keyword_routes(monkeypatch, tmp_path):
+    # Centroids come from the cache, so the router builds fine; only embedding the query fails
+    centroids = str(tmp_path / "centroids.json")
+    SemanticRouter(lambda text: [1.0, 0.0], lambda texts: [[1.0, 0.0], [0.0, 1.0]], ROUTES, centroids_path=centroids)
+    router = SemanticRouter(unavailable, unavailable, ROUTES, centroids_path=centroids)
+    monkeypatch.setitem(main.engines._engines, "router", router)
+
+    assert main.pick_routes("What is the population of France?") == ["population"]
+    assert main.pick_routes("Tell me about Canada") == ["canada"]
+    assert main.pick_routes("Write a haiku") == ["llm"]
+
+
+def test_router_build_failure_falls_back_to_keyword_routes(monkeypatch):
+    monkeypatch.setitem(main.engines._factories, "router", unavailable)
+    monkeypatch.delitem(main.engines._engines, "router", raising=False)
+
+    assert main.pick_routes("Search my note about Paris") == ["note_search"]
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from query_service import normalize_query
+
+# Two tiers in front of the LLM:
+#   exact - LRU + TTL keyed on the normalised query text
+#   near  - optional; reuses an answer whose query embedding has cosine
+#           similarity >= similarity_threshold with the new query
+#
+# Every lookup first asks version_fn() for the collection version. When it
+# differs from the version the cached answers were built against, the whole
+# cache is dropped, so new documents are never hidden behind old answers.
+
+
+class AnswerCache:
+    """LRU/TTL cache of generated answers, invalidated when the collection changes"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, similarity_threshold=None, version_fn=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.version_fn = version_fn or (lambda: 0)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (answer, expires_at, row or None)
+        self._version = None
+
+        # Near-duplicate tier: unit-length query vectors, one row per entry
+        self._matrix = None
+        self._row_keys = [None] * max_entries
+        self._free_rows = list(range(max_entries - 1, -1, -1))
+
+        self.lookups = 0
+        self.hits = 0
+        self.near_hits = 0
+        self.invalidations = 0
+
+    def current_version(self):
+        """Collection version right now (pass it back to put())"""
+        return self.version_fn()
+
+    def _check_version(self):
+        version = self.version_fn()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._clear()
+            self._version = version
+
+    def _clear(self):
+        self._entries.clear()
+        self._row_keys = [None] * self.max_entries
+        self._free_rows = list(range(self.max_entries - 1, -1, -1))
+
+    def _remove(self, key):
+        _, _, row = self._entries.pop(key)
+        if row is not None:
+            self._row_keys[row] = None
+            self._free_rows.append(row)
+
+    def get(self, query):
+        """Cached answer for this exact (normalised) query, or None"""
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            self.lookups += 1
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def get_similar(self, vector):
+        """Cached answer for a near-duplicate query embedding, or None"""
+        if self.similarity_threshold is None:
+            return None
+        with self._lock:
+            self._check_version()
+            if self._matrix is None or not self._entries:
+                return None
+
+            query = np.asarray(vector, dtype=np.float32)
+            query /= np.linalg.norm(query) or 1.0
+            scores = self._matrix @ query
+            occupied = np.array([k is not None for k in self._row_keys])
+            scores[~occupied] = -1.0
+
+            now = time.monotonic()
+            for row in np.argsort(-scores):
+                if scores[row] < self.similarity_threshold:
+                    break
+                key = self._row_keys[row]
+                if self._entries[key][1] < now:
+                    self._remove(key)
+                    continue
+                self._entries.move_to_end(key)
+                self.near_hits += 1
+                return self._entries[key][0]
+            return None
+
+    def put(self, query, answer, vector=None, version=None):
+        """Cache an answer; skipped if the collection changed since `version` was read"""
+        key = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self._version:
+                return
+            if self.max_entries <= 0:
+                return
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            row = None
+            if vector is not None and self.similarity_threshold is not None:
+                vector = np.asarray(vector, dtype=np.float32)
+                if self._matrix is None:
+                    self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                row = self._free_rows.pop()
+                self._matrix[row] = vector / (np.linalg.norm(vector) or 1.0)
+                self._row_keys[row] = key
+
+            self._entries[key] = (answer, time.monotonic() + self.ttl_seconds, row)
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits + self.near_hits
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.lookups - hits,
+                "hit_rate": round(hits / self.lookups, 4) if self.lookups else 0.0,
+                "invalidations": self.invalidations,
+                "collection_version": self._version,
+            }
@@ -1,48 +1,163 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import os
 
-# Correct Chroma import
-from langchain_community.vectorstores import Chroma
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
 
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.chains import RetrievalQA
-from langchain_ollama import OllamaLLM
+import common_path  # noqa: F401  (rag_common on sys.path)
+from answer_cache import AnswerCache
+from rag_common.context_builder import build_context
+from ingest_jobs import IngestionQueue
+from metrics import Gauge, record_chunks, render_metrics, span, trace
+from models import load_embedding_model, load_llm
+from ollama_client import stream_ai_response
+from query_service import RAGQueryService
+from vectorstore_registry import get_collection_version, get_qa_chain, get_retriever, get_vectorstore
 
 # Initialize FastAPI app
 app = FastAPI()
 
 # Load Mistral AI via Ollama
-llm = OllamaLLM(model="mistral")
+llm = load_llm()
 
-# Load the embeddings model
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2"
-)
+# Load the embeddings model (vectors are cached on disk, see rag_common/embedding_cache.py)
+embedding_model = load_embedding_model()
+
+# Load ChromaDB and the RetrievalQA chain (shared with document_loader via the registry).
+# RETRIEVAL_MODE: "dense" (vector search), "hybrid" (vector + BM25) or "lexical" (BM25 only)
+DB_PATH = os.getenv("CHROMA_DB_PATH", "chroma_db")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+vectorstore = get_vectorstore(embedding_model, DB_PATH)
+retriever = get_retriever(embedding_model, DB_PATH, k=3, retrieval_mode=RETRIEVAL_MODE)
+qa_chain = get_qa_chain(llm, embedding_model, DB_PATH, k=3, retrieval_mode=RETRIEVAL_MODE)
+
+# Async query path: coalesces identical queries, batches query embeddings
+# and caps how many Mistral generations run at once
+MAX_LLM_CONCURRENCY = int(os.getenv("MAX_LLM_CONCURRENCY", "2"))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
 
-# Load ChromaDB
-vectorstore = Chroma(
-    collection_name="documents",
-    persist_directory="chroma_db",
-    embedding_function=embedding_model
+# Answer cache: exact repeats always, near-duplicates only if ANSWER_CACHE_SIMILARITY is set (e.g. 0.95).
+# Cleared automatically whenever store_embeddings/ingest write to the collection.
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = os.getenv("ANSWER_CACHE_SIMILARITY")
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL,
+    similarity_threshold=float(ANSWER_CACHE_SIMILARITY) if ANSWER_CACHE_SIMILARITY else None,
+    version_fn=lambda: get_collection_version(DB_PATH, "documents")
 )
-retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
 
-# Initialize RetrievalQA chain
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm,
-    retriever=retriever
+query_service = RAGQueryService(
+    qa_chain,
+    vectorstore,
+    embedding_model,
+    k=3,
+    max_llm_concurrency=MAX_LLM_CONCURRENCY,
+    batch_window_ms=EMBED_BATCH_WINDOW_MS,
+    answer_cache=answer_cache
 )
+Gauge("rag_llm_active", "Mistral generations running", lambda: query_service.limiter.active)
+Gauge("rag_llm_waiting", "Requests queued for a Mistral slot", lambda: query_service.limiter.waiting)
 
-# Request model
+# Background ingestion of uploaded files (see ingest_jobs.py), polled by app_ui.py.
+# Only files in UPLOAD_DIR (where app_ui.py saves uploads) can be ingested: anything
+# indexed can be read back through /query.
+UPLOAD_DIR = os.path.realpath(os.getenv("UPLOAD_DIR", "uploaded_files"))
+ingestion_queue = IngestionQueue(embedding_model, DB_PATH)
+
+@app.on_event("shutdown")
+def stop_ingestion():
+    ingestion_queue.shutdown()
+
+# Request models
 class QueryRequest(BaseModel):
     query: str
 
+class IngestRequest(BaseModel):
+    path: str
+
 # POST endpoint
 @app.post("/query")
-def search_and_generate_response(request: QueryRequest):
-    response = qa_chain.invoke(request.query)
+async def search_and_generate_response(request: QueryRequest):
+    with trace(request.query, "/query"):
+        result = await query_service.answer(request.query)
+    # Same shape as qa_chain.invoke's output
+    response = {"query": request.query, "result": result}
     return {"query": request.query, "response": response}
 
+# Coalescing, embedding batch and LLM queueing statistics
+@app.get("/query/stats")
+def query_stats():
+    return query_service.stats()
+
+async def traced_stream(query):
+    """Retrieve and stream an answer, traced for as long as the response is streaming"""
+    # The trace is passed explicitly: each chunk may be produced in a different thread
+    with trace(query, "/query/stream") as request_trace:
+        with span("retrieve", request_trace):
+            docs = await run_in_threadpool(retriever.invoke, query)
+        record_chunks(docs, request_trace)
+        context = build_context(docs, query)
+        # Streams share /query's cap on concurrent Mistral generations, holding a slot until the last token
+        async with query_service.limiter.slot():
+            chunks = stream_ai_response(context, query, trace=request_trace)
+            try:
+                async for chunk in iterate_in_threadpool(chunks):
+                    yield chunk
+            finally:
+                chunks.close()  # client gone: stop reading from Ollama
+
+# Streaming POST endpoint: sends the answer as plain text chunks while Mistral generates it
+@app.post("/query/stream")
+def search_and_stream_response(request: QueryRequest):
+    return StreamingResponse(
+        traced_stream(request.query),
+        media_type="text/plain; charset=utf-8"
+    )
+
+# Per-stage latency histograms, token counts and tokens/sec (Prometheus text format)
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Answer cache hit/miss counters
+@app.get("/cache/stats")
+def cache_stats():
+    return answer_cache.stats()
+
+# Submit a file (already saved on this machine) for background ingestion
+@app.post("/ingest")
+def submit_ingest_job(request: IngestRequest):
+    path = os.path.realpath(request.path)  # symlinks and ".." resolved before the check
+    if os.path.commonpath([path, UPLOAD_DIR]) != UPLOAD_DIR:
+        raise HTTPException(status_code=403, detail=f"Only files in {UPLOAD_DIR} can be ingested")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=400, detail=f"File not found: {request.path}")
+    return ingestion_queue.submit(path).to_dict()
+
+# All recent ingestion jobs
+@app.get("/ingest")
+def list_ingest_jobs():
+    return {"jobs": [job.to_dict() for job in ingestion_queue.jobs()], "stats": ingestion_queue.stats()}
+
+# Status and progress of one job
+@app.get("/ingest/{job_id}")
+def ingest_job_status(job_id: str):
+    job = ingestion_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+# Cancel a queued or running job (chunks it already wrote are removed)
+@app.delete("/ingest/{job_id}")
+def cancel_ingest_job(job_id: str):
+    job = ingestion_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
 # Root endpoint
 @app.get("/")
 def home():
@@ -1,11 +1,14 @@
 import streamlit as st
 import requests
 import os
-# Import your helper functions from document_loader.py
-from document_loader import process_document, store_embeddings
+import time
 
 
 API_URL = "http://127.0.0.1:8000/query"
+STREAM_API_URL = "http://127.0.0.1:8000/query/stream"
+INGEST_API_URL = "http://127.0.0.1:8000/ingest"
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploaded_files")  # the API only ingests files from here
+POLL_SECONDS = 1.0
 
 # Set Streamlit page config
 st.set_page_config(page_title="AI-Powered Knowledge Assistant", page_icon="🤖")
@@ -17,26 +20,68 @@ st.title("📚 AI-Powered Knowledge Assistant")
 st.sidebar.header("📂 Upload Documents")
 
 # File uploader
-uploaded_file = st.sidebar.file_uploader("Upload a document (PDF, DOCX, TXT)", type=["pdf", "docx", "txt"])
+uploaded_files = st.sidebar.file_uploader("Upload documents (PDF, DOCX, TXT)", type=["pdf", "docx", "txt"],
+                                          accept_multiple_files=True)
 
-# Save uploaded file
+# Ingestion jobs submitted in this session: upload (name, size) -> job id.
+# Streamlit reruns the script on every interaction, so each upload is only submitted once.
+if "ingest_jobs" not in st.session_state:
+    st.session_state.ingest_jobs = {}
+
+# Save uploaded files and hand them to the API's background ingestion queue
 #creates a file path for storing the uploaded document in an uploaded files directory
-# Save uploaded file
-if uploaded_file:
+for uploaded_file in uploaded_files or []:
+    key = f"{uploaded_file.name}:{uploaded_file.size}"
+    if key in st.session_state.ingest_jobs:
+        continue
+
     # Ensure folder exists
-    os.makedirs("uploaded_files", exist_ok=True)
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
 
     # Save the file
-    file_path = os.path.join("uploaded_files", uploaded_file.name)
+    file_path = os.path.abspath(os.path.join(UPLOAD_DIR, os.path.basename(uploaded_file.name)))
     with open(file_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
-    st.sidebar.success(f"✅ {uploaded_file.name} uploaded successfully!")
 
-    # Process the uploaded file and store embeddings
-    texts = process_document(file_path)
-    if texts:
-        store_embeddings(texts)
-        st.sidebar.success("📄 Document processed and embeddings stored!")
+    try:
+        response = requests.post(INGEST_API_URL, json={"path": file_path})
+    except requests.RequestException as e:
+        st.sidebar.error(f"❌ Could not queue {uploaded_file.name}: is the API running? ({e})")
+        continue
+    if response.ok:
+        st.session_state.ingest_jobs[key] = response.json()["id"]
+    else:
+        st.sidebar.error(f"❌ Could not queue {uploaded_file.name}: {response.text}")
+
+# Show the progress of every job and keep polling while any is still running
+active = False
+for key, job_id in list(st.session_state.ingest_jobs.items()):
+    name = key.rsplit(":", 1)[0]
+    try:
+        response = requests.get(f"{INGEST_API_URL}/{job_id}")
+    except requests.RequestException as e:
+        st.sidebar.error(f"❌ Could not get the ingestion status: is the API running? ({e})")
+        break
+    if not response.ok:
+        continue
+    job = response.json()
+
+    if job["status"] == "done":
+        if job["new_chunks"]:
+            st.sidebar.success(f"📄 {name}: {job['new_chunks']} chunks embedded")
+        else:
+            st.sidebar.info(f"📄 {name}: already indexed, nothing to do.")
+    elif job["status"] == "failed":
+        st.sidebar.error(f"❌ {name}: {job['error']}")
+    elif job["status"] == "cancelled":
+        st.sidebar.warning(f"🚫 {name}: cancelled")
+    else:
+        active = True
+        label = f"⏳ {name}: {job['phase']} ({job['embedded_chunks']}/{job['new_chunks']} chunks)"
+        st.sidebar.progress(job["progress"], text=label)
+        if st.sidebar.button("Cancel", key=f"cancel-{job_id}"):
+            requests.delete(f"{INGEST_API_URL}/{job_id}")
+            st.rerun()
 
 
 
@@ -47,13 +92,24 @@ user_query = st.text_input("Type your question:")
 # Send query to API
 if st.button("Ask AI"):
     if user_query:
-        response = requests.post(API_URL, json={"query": user_query})
-        answer = response.json().get("response", "No response available.")
-        st.markdown(f"**🤖 AI Response:** {answer}")
+        # Render the answer token by token as the API streams it
+        placeholder = st.empty()
+        answer = ""
+        with requests.post(STREAM_API_URL, json={"query": user_query}, stream=True) as response:
+            for token in response.iter_content(chunk_size=None, decode_unicode=True):
+                answer += token
+                placeholder.markdown(f"**🤖 AI Response:** {answer}")
+        if not answer:
+            placeholder.markdown("**🤖 AI Response:** No response available.")
+        # Kept so the answer survives the progress-polling reruns below
+        st.session_state.last_answer = answer
     else:
         st.warning("Please enter a question.")
+elif st.session_state.get("last_answer"):
+    st.markdown(f"**🤖 AI Response:** {st.session_state.last_answer}")
 
 
-
-
-
+# Poll again shortly while uploads are still being ingested
+if active:
+    time.sleep(POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))  # the Mistral app modules
+sys.path.insert(0, HERE)
+
+from fake_ollama import fake_embedding, make_server
+
+# Offline benchmarks for the Mistral RAG app. Every Ollama call goes to
+# fake_ollama.py (started here unless --ollama-host is given), so results
+# depend on our code, not on the GPU:
+#
+#   ingestion  - process_document + store_embeddings, one file at a time,
+#                vs. the ingest.py pipeline, on a synthetic TXT corpus
+#   retrieval  - similarity_search latency (p50/p95/p99) at 1k/10k/100k chunks
+#   e2e        - /query throughput and latency of app.py under concurrent
+#                clients, plus time to first chunk on /query/stream
+#
+#   python benchmarks/bench_rag.py --out bench.json
+#   python benchmarks/bench_rag.py --suite retrieval --sizes 1000,10000 --backend numpy
+#
+# Results are written as JSON (--out) so runs can be compared before deploying.
+
+WORDS = (
+    "contract payment invoice delivery warranty clause supplier customer period notice termination "
+    "liability insurance product service quality report annual budget revenue cost margin policy "
+    "employee training safety audit compliance data privacy security access network server backup "
+    "storage incident response schedule project milestone risk review approval signature document"
+).split()
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds"""
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def synthetic_text(rng, n_chars):
+    """Paragraphs of random words, about n_chars long"""
+    paragraphs, length = [], 0
+    while length < n_chars:
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+                     for _ in range(rng.randint(3, 8))]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def write_corpus(directory, n_docs, doc_chars, seed):
+    """Synthetic .txt documents; a different seed gives different chunks (no embedding cache hits)"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(n_docs):
+        path = os.path.join(directory, f"doc_{i:04d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(synthetic_text(rng, doc_chars))
+        paths.append(path)
+    return paths
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class HashEmbeddings(Embeddings):
+    """Same vectors as the fake Ollama server, computed in-process (for building large stores quickly)"""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.model_name = f"bench-hash-{dim}"
+
+    def embed_documents(self, texts):
+        return [fake_embedding(text, self.dim) for text in texts]
+
+    def embed_query(self, text):
+        return fake_embedding(text, self.dim)
+
+
+# ----------------- Ingestion -----------------
+def bench_ingestion(args, workdir):
+    from document_loader import process_document, store_embeddings
+    from ingest import ingest_paths
+
+    doc_chars = args.doc_kb * 1024
+    results = {"documents": args.docs, "document_chars": doc_chars}
+
+    paths = write_corpus(os.path.join(workdir, "corpus_serial"), args.docs, doc_chars, seed=1)
+    db_path = os.path.join(workdir, "ingest_serial_db")
+    chunks = 0
+    start = time.perf_counter()
+    for path in paths:
+        texts = process_document(path)
+        store_embeddings(texts, db_path=db_path, source=path)
+        chunks += len(texts)
+    seconds = time.perf_counter() - start
+    results["serial"] = {
+        "files": len(paths),
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "files_per_sec": round(len(paths) / seconds, 2),
+        "chunks_per_sec": round(chunks / seconds, 2),
+    }
+
+    paths = write_corpus(os.path.join(workdir, "corpus_pipeline"), args.docs, doc_chars, seed=2)
+    stats = ingest_paths(paths, db_path=os.path.join(workdir, "ingest_pipeline_db"), workers=args.workers)
+    results["pipeline"] = dict(stats, workers=args.workers)
+
+    print(f"🔹 Ingestion: serial {results['serial']['chunks_per_sec']} chunks/s, "
+          f"pipeline {results['pipeline']['chunks_per_sec']} chunks/s")
+    return results
+
+
+# ----------------- Retrieval -----------------
+def bench_retrieval(args, workdir):
+    from vectorstore_registry import VECTOR_BACKEND, VECTOR_QUANTIZATION, get_vectorstore, persist_vectorstore
+
+    embeddings = HashEmbeddings(args.dim)
+    rng = random.Random(3)
+    queries = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8))) for _ in range(args.queries)]
+    query_vectors = embeddings.embed_documents(queries)
+
+    results = {"backend": VECTOR_BACKEND, "quantization": VECTOR_QUANTIZATION, "k": args.k, "sizes": {}}
+    for size in args.sizes:
+        db_path = os.path.join(workdir, f"retrieval_{size}")
+        vectorstore = get_vectorstore(embeddings, db_path, "bench")
+
+        start = time.perf_counter()
+        for offset in range(0, size, args.build_batch):
+            texts = [f"chunk {i}: " + synthetic_text(rng, 300) for i in range(offset, min(offset + args.build_batch, size))]
+            vectorstore.add_texts(texts, ids=[f"chunk-{i}" for i in range(offset, offset + len(texts))])
+        persist_vectorstore(vectorstore)
+        build_seconds = time.perf_counter() - start
+
+        for vector in query_vectors[:args.warmup]:
+            vectorstore.similarity_search_by_vector(vector, k=args.k)
+
+        by_vector = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            vectorstore.similarity_search_by_vector(vector, k=args.k)
+            by_vector.append(time.perf_counter() - start)
+
+        by_query = []
+        for query in queries:
+            start = time.perf_counter()
+            vectorstore.similarity_search(query, k=args.k)
+            by_query.append(time.perf_counter() - start)
+
+        results["sizes"][str(size)] = {
+            "build_seconds": round(build_seconds, 3),
+            "similarity_search_by_vector": percentiles(by_vector),
+            "similarity_search": percentiles(by_query),
+        }
+        summary = results["sizes"][str(size)]["similarity_search"]
+        print(f"🔹 Retrieval @ {size} chunks: p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+              f"p99 {summary['p99_ms']} ms")
+    return results
+
+
+# ----------------- End to end -----------------
+async def _run_clients(base_url, path, concurrency, n_requests, label, stream=False):
+    import httpx
+
+    latencies, first_chunk = [], []
+    errors = 0
+    counter = iter(range(n_requests))
+
+    async def client(http):
+        nonlocal errors
+        for i in counter:
+            # Unique questions, so neither coalescing nor the answer cache hides the real work
+            payload = {"query": f"{label} question {i}: what does the {WORDS[i % len(WORDS)]} clause say?"}
+            start = time.perf_counter()
+            try:
+                if stream:
+                    async with http.stream("POST", path, json=payload) as response:
+                        response.raise_for_status()
+                        first = None
+                        async for _ in response.aiter_bytes():
+                            if first is None:
+                                first = time.perf_counter() - start
+                        first_chunk.append(first if first is not None else time.perf_counter() - start)
+                else:
+                    response = await http.post(path, json=payload)
+                    response.raise_for_status()
+            except Exception as e:
+                errors += 1
+                print(f"⚠️ {path} request failed: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+    result = {
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "requests_per_sec": round(len(latencies) / seconds, 3),
+    }
+    if latencies:
+        result["latency"] = percentiles(latencies)
+    if first_chunk:
+        result["time_to_first_chunk"] = percentiles(first_chunk)
+    return result
+
+
+def bench_e2e(args, workdir):
+    import uvicorn
+    from ingest import ingest_paths
+
+    # Index a small corpus, then import app.py (it opens the collection at import time)
+    paths = write_corpus(os.path.join(workdir, "corpus_e2e"), args.e2e_docs, 8 * 1024, seed=4)
+    ingest_paths(paths, db_path=os.environ["CHROMA_DB_PATH"], workers=args.workers)
+    import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{port}"
+    results = {"max_llm_concurrency": app.MAX_LLM_CONCURRENCY, "query": [], "stream": []}
+    try:
+        for concurrency in args.concurrency:
+            run = asyncio.run(_run_clients(base_url, "/query", concurrency, args.requests, f"c{concurrency}"))
+            results["query"].append(run)
+            print(f"🔹 /query x{concurrency}: {run['requests_per_sec']} req/s, "
+                  f"p95 {run.get('latency', {}).get('p95_ms')} ms")
+
+        run = asyncio.run(_run_clients(base_url, "/query/stream", 1, args.stream_requests, "stream", stream=True))
+        results["stream"].append(run)
+        print(f"🔹 /query/stream: first chunk p50 {run.get('time_to_first_chunk', {}).get('p50_ms')} ms")
+        results["service_stats"] = app.query_service.stats()
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+    return results
+
+
+SUITES = {"ingestion": bench_ingestion, "retrieval": bench_retrieval, "e2e": bench_e2e}
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Mistral RAG app")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="suite(s) to run (default: all)")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], help="VECTOR_BACKEND for the run")
+    parser.add_argument("--workdir", help="keep corpora and stores here instead of a temp dir")
+    # fake Ollama
+    parser.add_argument("--ollama-host", help="use an already running (fake or real) Ollama instead")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake Ollama delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="fake Ollama generation speed")
+    parser.add_argument("--tokens", type=int, default=64, help="fake Ollama tokens per answer")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="fake Ollama delay per embedding call")
+    parser.add_argument("--dim", type=int, default=768, help="embedding dimension")
+    # ingestion
+    parser.add_argument("--docs", type=int, default=50, help="documents in the ingestion corpus")
+    parser.add_argument("--doc-kb", type=int, default=20, help="size of each document in KB")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes for ingest.py")
+    # retrieval
+    parser.add_argument("--sizes", type=_int_list, default=[1000, 10000, 100000], help="comma-separated chunk counts")
+    parser.add_argument("--queries", type=int, default=200, help="timed queries per size")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--build-batch", type=int, default=4096, help="chunks per add_texts call when building")
+    # end to end
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 4, 16], help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=64, help="/query requests per concurrency level")
+    parser.add_argument("--stream-requests", type=int, default=8)
+    parser.add_argument("--e2e-docs", type=int, default=20)
+    args = parser.parse_args()
+
+    suites = args.suite or list(SUITES)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag_bench_")
+    os.makedirs(workdir, exist_ok=True)
+
+    fake_server = None
+    host = args.ollama_host
+    if host is None:
+        port = free_port()
+        fake_server = make_server(port=port, latency_ms=args.latency_ms, tokens_per_sec=args.tokens_per_sec,
+                                  tokens=args.tokens, dim=args.dim, embed_latency_ms=args.embed_latency_ms)
+        threading.Thread(target=fake_server.serve_forever, daemon=True).start()
+        host = f"http://127.0.0.1:{port}"
+
+    # Must be set before the app modules are imported (see models.py, vectorstore_registry.py)
+    os.environ["OLLAMA_HOST"] = host
+    os.environ.setdefault("EMBEDDING_MODEL", "ollama/fake-embed")
+    os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(workdir, "embedding_cache")
+    os.environ["CHROMA_DB_PATH"] = os.path.join(workdir, "e2e_db")
+    os.environ["ANSWER_CACHE_SIZE"] = "0"  # measure the real path, not cache hits
+    if args.backend:
+        os.environ["VECTOR_BACKEND"] = args.backend
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "vector_backend": os.getenv("VECTOR_BACKEND", "chroma"),
+            "vector_quantization": os.getenv("VECTOR_QUANTIZATION"),
+            "embedding_model": os.environ["EMBEDDING_MODEL"],
+            "ollama_host": host,
+            "fake_ollama": None if fake_server is None else {
+                "latency_ms": args.latency_ms,
+                "tokens_per_sec": args.tokens_per_sec,
+                "tokens": args.tokens,
+                "embed_latency_ms": args.embed_latency_ms,
+                "dim": args.dim,
+            },
+        },
+        "results": {},
+    }
+    try:
+        for name in suites:
+            start = time.perf_counter()
+            report["results"][name] = SUITES[name](args, workdir)
+            report["results"][name]["suite_seconds"] = round(time.perf_counter() - start, 3)
+    finally:
+        if fake_server is not None:
+            fake_server.shutdown()
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import hashlib
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Stand-in for the Ollama endpoints used by the Mistral app, so the
+# benchmarks (bench_rag.py) run without a GPU or a pulled model:
+#
+#   POST /api/generate    - streamed (NDJSON) or single JSON answer
+#   POST /api/embeddings  - {"embedding": [...]}        (single prompt)
+#   POST /api/embed       - {"embeddings": [[...], ...]} (langchain_ollama)
+#   GET  /api/tags        - a fake model list
+#
+# Latency and token rate are configurable; embeddings are deterministic
+# pseudo-random unit vectors seeded from the text.
+#
+#   python benchmarks/fake_ollama.py --port 11435 --latency-ms 200 --tokens-per-sec 40
+
+
+def fake_embedding(text, dim):
+    """Deterministic unit vector for a text"""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive + chunked streaming, like the real server
+    settings = None  # argparse.Namespace, set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": f"{self.settings.model}:latest"}]})
+        elif self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        request = self._read_json()
+        if self.path == "/api/generate":
+            self._generate(request)
+        elif self.path == "/api/embeddings":
+            self._sleep(self.settings.embed_latency_ms)
+            self._send_json({"embedding": fake_embedding(request.get("prompt", ""), self.settings.dim)})
+        elif self.path == "/api/embed":
+            inputs = request.get("input", "")
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self._sleep(self.settings.embed_latency_ms)
+            self._send_json({
+                "model": request.get("model", self.settings.model),
+                "embeddings": [fake_embedding(text, self.settings.dim) for text in inputs],
+            })
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    @staticmethod
+    def _sleep(ms):
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def _generate(self, request):
+        settings = self.settings
+        model = request.get("model", settings.model)
+        prompt = request.get("prompt", "")
+        tokens = [f"token{i} " for i in range(settings.tokens)]
+        token_delay = 1 / settings.tokens_per_sec if settings.tokens_per_sec > 0 else 0.0
+
+        start = time.perf_counter()
+        self._sleep(settings.latency_ms)  # prompt evaluation / time to first token
+        prompt_done = time.perf_counter()
+
+        def final_fields():
+            end = time.perf_counter()
+            return {
+                "model": model,
+                "done": True,
+                "done_reason": "stop",
+                "prompt_eval_count": len(prompt.split()),
+                "prompt_eval_duration": int((prompt_done - start) * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((end - prompt_done) * 1e9),
+                "total_duration": int((end - start) * 1e9),
+            }
+
+        if not request.get("stream", True):
+            time.sleep(token_delay * len(tokens))
+            self._send_json(dict(final_fields(), response="".join(tokens)))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            time.sleep(token_delay)
+            self._write_chunk({"model": model, "response": token, "done": False})
+        self._write_chunk(dict(final_fields(), response=""))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=11435, latency_ms=200.0, tokens_per_sec=40.0, tokens=64, dim=768,
+                embed_latency_ms=0.0, model="mistral"):
+    """HTTP server answering like Ollama (call serve_forever, or run it in a thread)"""
+    settings = argparse.Namespace(latency_ms=latency_ms, tokens_per_sec=tokens_per_sec, tokens=tokens, dim=dim,
+                                  embed_latency_ms=embed_latency_ms, model=model)
+    handler = type("ConfiguredFakeOllamaHandler", (FakeOllamaHandler,), {"settings": settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0, help="generation speed (0 = instant)")
+    parser.add_argument("--tokens", type=int, default=64, help="tokens per answer")
+    parser.add_argument("--dim", type=int, default=768, help="embedding dimension")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="delay per embedding request")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency_ms, args.tokens_per_sec, args.tokens, args.dim,
+                         args.embed_latency_ms)
+    print(f"✅ Fake Ollama listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# context_builder, embedding_cache and numpy_store are shared with langchain_local
+# and live in the rag_common package at the repository root; importing this
+# module makes it importable however the app is started (uvicorn, streamlit,
+# scripts, benchmarks).
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
@@ -1,88 +1,58 @@
 import os
-import fitz  # PyMuPDF for PDFs
-import docx
-import requests
-
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
-
-from langchain_huggingface import HuggingFaceEmbeddings
-#from langchain_chroma import Chroma
-from langchain.vectorstores import Chroma
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-from langchain_ollama import OllamaLLM
 from langchain_community.document_loaders import TextLoader
-from langchain.chains import RetrievalQA
 
-
-# Load the embeddings model
-embedding_model = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2"
+import common_path  # noqa: F401  (rag_common on sys.path)
+from rag_common.context_builder import build_context
+from ingest import CHUNK_OVERLAP, CHUNK_SIZE
+from lexical_index import open_for_update, save_index
+from manifest import IngestManifest, chunk_id, file_hash
+from metrics import StageTimingHandler
+from models import EMBEDDING_MODEL_NAME, load_embedding_model, load_llm
+from ollama_client import OLLAMA_API_URL, generate_ai_response, stream_ai_response
+from text_extraction import (
+    extract_text,
+    extract_text_from_pdf,
+    extract_text_from_word,
+    extract_text_from_txt,
+    iter_text,
+    stream_chunks,
 )
+from vectorstore_registry import bump_collection_version, get_qa_chain, get_vectorstore, persist_vectorstore
+
+
+# Load the embeddings model (vectors are cached on disk, see rag_common/embedding_cache.py)
+embedding_model = load_embedding_model()
 
 # Load the LLM (Mistral) using Ollama
-llm = OllamaLLM(model="mistral")
+llm = load_llm()
 
 
 def search_and_summarize(query, db_path="chroma_db"):
     """Retrieve relevant documents and summarize them using Mistral AI"""
     
-    # Load ChromaDB
-    vectorstore = Chroma(
-        collection_name="documents",
-        persist_directory=db_path,
-        embedding_function=embedding_model
-    )
-    
-    # Create a LangChain Retrieval-QA pipeline
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-    qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever)
+    # Reuse the shared Retrieval-QA pipeline for this ChromaDB collection
+    qa_chain = get_qa_chain(llm, embedding_model, db_path)
 
-    # Get AI-generated answer
-    response = qa_chain.invoke(query)
+    # Get AI-generated answer (StageTimingHandler times the retrieve / prompt / generate stages)
+    response = qa_chain.invoke(query, config={"callbacks": [StageTimingHandler()]})
 
     print("\n💡 AI-Powered Answer:")
     print(response.get("result"))
 
 
-def generate_ai_response(context, query):
-    """Send user query along with retrieved documents to Mistral AI for RAG"""
-    prompt = f"""
-    You are an AI assistant with access to the following information:
-    
-    {context}
-    
-    Based on this, answer the following question:
-    {query}
-    """
-    #A payload is just the data you send to a web API in a request.
-#Think of it as the message or instructions you give to the server.
-    payload = {
-                "model": "mistral",# which AI model to use
-                "prompt": prompt,  # the text you want the AI to respond to
-                "stream": False  # do you want the response streamed in real-time? False = wait for full answer
-                
-                }
-    response = requests.post(OLLAMA_API_URL, json=payload)
-    
-    return response.json().get("response", "No response generated.")
-
-
 #this search document is a function that takes a query , a search term or phrase as input and searchs
 #for the most relevent document stored in embeddings in chroma db.
 #db is the default directory where chroma db stroes the vector embeddings.
 def search_and_generate_response(query, db_path="chroma_db"):
     """Retrieve relevant documents and use Mistral AI for contextual response"""
 
-    #persist_directory = loads the existing vector database from chroma DB
+    #loads the existing vector database from chroma DB (shared client, opened once per process)
     #embedding fuction = embedding model uses the same embedding model , which is the huggingface embedding to ensure consistency
     #betwwen stored model and the query
-    vectorstore = Chroma(
-        collection_name="documents",
-        persist_directory=db_path,
-        embedding_function=embedding_model
-    )
+    vectorstore = get_vectorstore(embedding_model, db_path)
 
     #this results equal to vector dot similarity search query and equal 3 
     #it converts the query into embeddings
@@ -90,52 +60,90 @@ def search_and_generate_response(query, db_path="chroma_db"):
     #return a list of the best matching
     results = vectorstore.similarity_search(query, k=3)  # Retrieve top 3 matches
     
-    # Combine retrieved documents into context
-    context = "\n\n".join([doc.page_content for doc in results])
-    
-    # Generate AI response using RAG
-    ai_response = generate_ai_response(context, query)
+    # Combine retrieved documents into context (deduplicated and fitted to the token budget)
+    context = build_context(results, query)
     
+    # Generate AI response using RAG, printing tokens as they arrive
     print("\n💡 AI-Powered Answer:")
-    print(ai_response)
+    for token in stream_ai_response(context, query):
+        print(token, end="", flush=True)
+    print()
 
 
-def process_document(file_path):
-    """Extract text, split it, and convert to embeddings"""
-    text = extract_text(file_path)
-    
-    if not text:
-        return None
+def iter_document_chunks(file_path, workers=None):
+    """Yield (page/paragraph number, chunk) while the document is still being read.
 
+    workers > 1 extracts the pages of large PDFs in parallel processes.
+    """
     # Split text into smaller chunks for better search performance
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=50
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
     )
-    texts = text_splitter.split_text(text)
+    return stream_chunks(iter_text(file_path, workers=workers), text_splitter, CHUNK_SIZE)
+
+
+def process_document(file_path, workers=None):
+    """Extract text, split it, and convert to embeddings"""
+    texts = [chunk for _, chunk in iter_document_chunks(file_path, workers=workers)]
+
+    if not texts:
+        return None
 
     return texts
 
 
-def store_embeddings(texts, db_path="chroma_db"):
-    """Store text embeddings in ChromaDB"""
-    vectorstore = Chroma(
-        collection_name="documents",
-        persist_directory=db_path,
-        embedding_function=embedding_model
-    )
-    vectorstore.add_texts(texts)
-    
-    print("✅ Embeddings stored successfully!")
+def store_embeddings(texts, db_path="chroma_db", source=None):
+    """Store text embeddings in ChromaDB.
+
+    Chunks get stable content-hash ids, so storing the same text twice never
+    creates duplicate vectors. When the source file is given, only chunks that
+    are new since the last ingest of that file are embedded and chunks from
+    its previous version are deleted. The BM25 index (lexical_index.py) is
+    kept in step with the vectors.
+    """
+    vectorstore = get_vectorstore(embedding_model, db_path)
+    lexical = open_for_update(db_path)
+
+    if source is None:
+        unique = {chunk_id(None, text): text for text in texts}
+        vectorstore.add_texts(list(unique.values()), ids=list(unique.keys()))
+        lexical.add(list(unique.keys()), list(unique.values()))
+        persist_vectorstore(vectorstore)
+        save_index(lexical, db_path)
+        bump_collection_version(db_path)
+        print("✅ Embeddings stored successfully!")
+        return
+
+    manifest = IngestManifest(db_path)
+    ids, new_ids, new_texts, stale_ids = manifest.plan(source, texts)
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        lexical.delete(stale_ids)
+    if new_texts:
+        metadatas = [{"source": source}] * len(new_texts)
+        vectorstore.add_texts(new_texts, metadatas=metadatas, ids=new_ids)
+        lexical.add(new_ids, new_texts, metadatas)
+    if new_texts or stale_ids:
+        persist_vectorstore(vectorstore)
+        save_index(lexical, db_path)
+    manifest.record(source, file_hash(source), ids)
+    manifest.save()
+    if new_texts or stale_ids:
+        bump_collection_version(db_path)
+
+    print(f"✅ Embeddings stored successfully! ({len(new_texts)} new, "
+          f"{len(ids) - len(new_texts)} unchanged, {len(stale_ids)} removed)")
+
+
+def is_document_indexed(file_path, db_path="chroma_db"):
+    """True if this exact file version has already been embedded"""
+    return IngestManifest(db_path).is_unchanged(file_path)
 
 
 def search_documents(query, db_path="chroma_db"):
     """Search stored embeddings in ChromaDB"""
-    vectorstore = Chroma(
-        collection_name="documents",
-        persist_directory=db_path,
-        embedding_function=embedding_model
-    )
+    vectorstore = get_vectorstore(embedding_model, db_path)
     results = vectorstore.similarity_search(query, k=3)  # Retrieve top 3 matches
     
     for idx, result in enumerate(results):
@@ -145,54 +153,6 @@ def search_documents(query, db_path="chroma_db"):
     return results
 
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a PDF file"""
-    text = ""
-    try:
-        doc = fitz.open(pdf_path)
-        for page in doc:
-            text += page.get_text("text") + "\n"
-    except Exception as e:
-        print(f"Error reading PDF {pdf_path}: {e}")
-    return text
-
-
-def extract_text_from_word(doc_path):
-    """Extract text from a Word (.docx) file"""
-    text = ""
-    try:
-        doc = docx.Document(doc_path)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-    except Exception as e:
-        print(f"Error reading Word file {doc_path}: {e}")
-    return text
-
-
-def extract_text_from_txt(txt_path):
-    """Extract text from a TXT file"""
-    text = ""
-    try:
-        with open(txt_path, "r", encoding="utf-8") as file:
-            text = file.read()
-    except Exception as e:
-        print(f"Error reading TXT file {txt_path}: {e}")
-    return text
-
-
-def extract_text(file_path):
-    """Detect file type and extract text accordingly"""
-    if file_path.endswith(".pdf"):
-        return extract_text_from_pdf(file_path)
-    elif file_path.endswith(".docx"):
-        return extract_text_from_word(file_path)
-    elif file_path.endswith(".txt"):
-        return extract_text_from_txt(file_path)
-    else:
-        print(f"Unsupported file format: {file_path}")
-        return ""
-
-
 # Example usage
 if __name__ == "__main__":
      #sample_file = "sample.pdf"
@@ -0,0 +1,252 @@
+import argparse
+import glob
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from manifest import IngestManifest, file_hash
+from text_extraction import file_type, iter_text, stream_chunks
+
+# Bulk ingestion pipeline:
+#
+#   files --(process pool: extract + split)--> chunks --(planner thread)--> new chunks --(embed batches)--> ChromaDB
+#
+# Each stage is connected by a bounded queue, so a slow stage applies
+# back-pressure instead of letting text pile up in memory, and one very
+# large file only occupies one worker while the others keep going.
+# Files whose hash matches the ingest manifest are skipped before
+# extraction, and only chunks that changed are embedded. Files are split with
+# the same iter_text + stream_chunks path as uploads (ingest_jobs.py,
+# document_loader.py), so every path gives a file the same chunk ids.
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+EMBED_BATCH_SIZE = 64
+QUEUE_SIZE = 32
+
+_DONE = object()
+_FILE_DONE = object()
+
+
+def find_documents(path_or_pattern):
+    """Return the supported files in a directory (recursively) or matching a glob pattern"""
+    if os.path.isdir(path_or_pattern):
+        paths = []
+        for root, _, files in os.walk(path_or_pattern):
+            paths.extend(os.path.join(root, name) for name in files)
+    else:
+        paths = glob.glob(path_or_pattern, recursive=True)
+
+    return sorted(p for p in paths if file_type(p) in SUPPORTED_EXTENSIONS)
+
+
+def _put(q, item, stop):
+    """Put on a bounded queue, giving up if the pipeline is being torn down"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    """Get from a queue, returning _DONE if the pipeline is being torn down"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+_splitter = None
+
+
+def _extract_if_changed(path, known_hash):
+    """Worker: hash a file and extract and split its text, unless it is unchanged"""
+    global _splitter
+    digest = file_hash(path)
+    if digest == known_hash:
+        return digest, None
+    if _splitter is None:
+        _splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return digest, [chunk for _, chunk in stream_chunks(iter_text(path), _splitter, CHUNK_SIZE)]
+
+
+def _extract_stage(paths, manifest, files_q, workers, stop, errors):
+    """Extract and split files in worker processes, emitting results in completion order"""
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {}
+        remaining = iter(paths)
+
+        def submit(path):
+            pending[pool.submit(_extract_if_changed, path, manifest.known_hash(path))] = path
+
+        # Keep a small window of files in flight so memory stays bounded
+        for path in remaining:
+            submit(path)
+            if len(pending) >= workers * 2:
+                break
+
+        while pending and not stop.is_set():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                digest, chunks = future.result()
+                if not _put(files_q, (path, digest, chunks), stop):
+                    return
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    submit(next_path)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        _put(files_q, _DONE, stop)
+
+
+def _plan_stage(manifest, files_q, chunks_q, stats, stop, errors):
+    """Emit the chunks of each split file that are not embedded yet.
+
+    After a file's chunks, a _FILE_DONE marker carries what the manifest
+    needs once those chunks are written.
+    """
+    try:
+        while (item := _get(files_q, stop)) is not _DONE:
+            path, digest, chunks = item
+            stats["files"] += 1
+            if chunks is None:
+                stats["skipped_files"] += 1
+                continue
+            ids, new_ids, new_texts, stale_ids = manifest.plan(path, chunks)
+            for cid, chunk in zip(new_ids, new_texts):
+                if not _put(chunks_q, (path, cid, chunk), stop):
+                    return
+            stats["skipped_chunks"] += len(ids) - len(new_ids)
+            if not _put(chunks_q, (_FILE_DONE, path, digest, ids, stale_ids), stop):
+                return
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+    finally:
+        _put(chunks_q, _DONE, stop)
+
+
+def ingest_paths(paths, db_path="chroma_db", workers=None, batch_size=EMBED_BATCH_SIZE):
+    """Extract, split and embed many files in parallel; returns throughput stats"""
+    # Imported here rather than at module level: worker processes import this
+    # module too, and must not each load the embeddings model.
+    from document_loader import embedding_model
+    from lexical_index import open_for_update, save_index
+    from vectorstore_registry import bump_collection_version, get_vectorstore, persist_vectorstore
+
+    vectorstore = get_vectorstore(embedding_model, db_path)
+    lexical = open_for_update(db_path)
+
+    manifest = IngestManifest(db_path)
+    workers = workers or os.cpu_count() or 1
+    files_q = queue.Queue(maxsize=QUEUE_SIZE)
+    chunks_q = queue.Queue(maxsize=QUEUE_SIZE * batch_size)
+    stop = threading.Event()
+    errors = []
+    stats = {"files": 0, "chunks": 0, "skipped_files": 0, "skipped_chunks": 0, "deleted_chunks": 0}
+
+    stages = [
+        threading.Thread(target=_extract_stage, args=(paths, manifest, files_q, workers, stop, errors), daemon=True),
+        threading.Thread(target=_plan_stage, args=(manifest, files_q, chunks_q, stats, stop, errors), daemon=True),
+    ]
+
+    start = time.perf_counter()
+    for stage in stages:
+        stage.start()
+
+    batch, ids, sources = [], [], []
+    finished = []  # files whose chunks are all in the current batch or already written
+
+    def flush():
+        if batch:
+            metadatas = [{"source": s} for s in sources]
+            vectorstore.add_texts(batch, metadatas=metadatas, ids=ids)
+            lexical.add(ids, batch, metadatas)
+            stats["chunks"] += len(batch)
+        for path, digest, file_ids, stale_ids in finished:
+            if stale_ids:
+                vectorstore.delete(ids=stale_ids)
+                lexical.delete(stale_ids)
+                stats["deleted_chunks"] += len(stale_ids)
+            manifest.record(path, digest, file_ids)
+        batch.clear()
+        ids.clear()
+        sources.clear()
+        finished.clear()
+
+    try:
+        while (item := _get(chunks_q, stop)) is not _DONE:
+            if item[0] is _FILE_DONE:
+                finished.append(item[1:])
+                continue
+            path, cid, chunk = item
+            batch.append(chunk)
+            ids.append(cid)
+            sources.append(path)
+            if len(batch) >= batch_size:
+                flush()
+        if not errors:
+            flush()
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+        if stats["chunks"] or stats["deleted_chunks"]:
+            persist_vectorstore(vectorstore)
+            save_index(lexical, db_path)
+        manifest.save()
+        if stats["chunks"] or stats["deleted_chunks"]:
+            bump_collection_version(db_path)
+
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["files_per_sec"] = round(stats["files"] / elapsed, 2) if elapsed else 0.0
+    stats["chunks_per_sec"] = round(stats["chunks"] / elapsed, 2) if elapsed else 0.0
+    return stats
+
+
+def ingest_directory(path_or_pattern, db_path="chroma_db", workers=None, batch_size=EMBED_BATCH_SIZE):
+    """Ingest every supported document in a directory or matching a glob pattern"""
+    paths = find_documents(path_or_pattern)
+    if not paths:
+        print(f"No supported documents found for {path_or_pattern}")
+        return {"files": 0, "chunks": 0, "seconds": 0.0, "files_per_sec": 0.0, "chunks_per_sec": 0.0,
+                "skipped_files": 0, "skipped_chunks": 0, "deleted_chunks": 0}
+
+    stats = ingest_paths(paths, db_path=db_path, workers=workers, batch_size=batch_size)
+    print(
+        f"✅ Ingested {stats['files']} files / {stats['chunks']} chunks in {stats['seconds']}s "
+        f"({stats['files_per_sec']} files/s, {stats['chunks_per_sec']} chunks/s); "
+        f"skipped {stats['skipped_files']} unchanged files and {stats['skipped_chunks']} unchanged chunks, "
+        f"removed {stats['deleted_chunks']} stale chunks"
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest documents into ChromaDB")
+    parser.add_argument("source", help="Directory or glob pattern, e.g. 'docs/**/*.pdf'")
+    parser.add_argument("--db", default="chroma_db", help="ChromaDB persist directory")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Chunks per embedding batch")
+    args = parser.parse_args()
+
+    ingest_directory(args.source, db_path=args.db, workers=args.workers, batch_size=args.batch_size)
@@ -0,0 +1,341 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from ingest import CHUNK_OVERLAP, CHUNK_SIZE, EMBED_BATCH_SIZE
+from lexical_index import open_for_update, save_index
+from manifest import IngestManifest, chunk_id, file_hash, source_key
+from text_extraction import iter_text, stream_chunks
+from vectorstore_registry import bump_collection_version, get_vectorstore, persist_vectorstore
+
+# Background ingestion jobs behind app.py's /ingest endpoints (app_ui.py
+# submits uploads there instead of embedding them inside the Streamlit script):
+#
+#   submit(path) --(extract threads, one file each)--> chunks --(one embedder thread)--> vector store
+#
+# Every job's new chunks go into one shared queue and the embedder takes
+# batches of up to EMBED_BATCH_SIZE chunks across all jobs, so several small
+# uploads still run the model at full batch width. A file is only recorded
+# in the ingest manifest once all of its chunks are written; a cancelled job
+# has the chunks it already wrote removed again.
+#
+# Submitting a file whose same version is already queued or running returns
+# the existing job, so Streamlit reruns never ingest a file twice.
+#
+# The queue lives as long as the app, so other processes (ingest.py, another
+# worker) may write the same collection meanwhile: the manifest is refreshed
+# before each job is planned, and the manifest, BM25 index and vector store
+# all merge with the latest saved version under a lock file when they are
+# saved (see manifest.py, lexical_index.py, numpy_store.py).
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+BATCH_WAIT_MS = float(os.getenv("INGEST_BATCH_WAIT_MS", "50"))  # wait this long for a fuller batch
+MAX_PENDING_CHUNKS = EMBED_BATCH_SIZE * 8  # back-pressure on extraction
+MAX_FINISHED_JOBS = 200
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class IngestJob:
+    """One file being ingested"""
+
+    def __init__(self, path, digest):
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.digest = digest
+        self.status = QUEUED
+        self.phase = "queued"  # queued -> extracting -> embedding -> finished
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+        self.chunks = 0            # chunks found in the file so far
+        self.new_chunks = 0        # ... of which not embedded before
+        self.embedded = 0          # ... of which already written
+        self.extracted = False     # all chunks found
+        self.ids = []              # every chunk id of this version, for the manifest
+        self.stale_ids = []        # chunks of the previous version to delete
+        self.written_ids = []      # new chunks already in the vector store
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def progress(self):
+        """0.0 - 1.0, embedded / new chunks found so far (see phase for whether reading is done)"""
+        if self.status == DONE:
+            return 1.0
+        if not self.new_chunks:
+            return 0.0
+        return round(min(self.embedded / self.new_chunks, 0.99), 3)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "path": self.path,
+            "status": self.status,
+            "phase": self.phase,
+            "progress": self.progress(),
+            "chunks": self.chunks,
+            "new_chunks": self.new_chunks,
+            "embedded_chunks": self.embedded,
+            "removed_chunks": len(self.stale_ids) if self.status == DONE else 0,
+            "error": self.error,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestionQueue:
+    """Worker pool ingesting submitted files into one collection in the background"""
+
+    def __init__(self, embedding_model, db_path="chroma_db", workers=INGEST_WORKERS, batch_size=EMBED_BATCH_SIZE):
+        self.embedding_model = embedding_model
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.manifest = IngestManifest(db_path)
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+        self._jobs = {}
+        self._pending = deque()  # (job, chunk id, text) waiting to be embedded
+        self._cond = threading.Condition()
+        self._stopping = False
+        self.batches = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-extract")
+        self._embedder = threading.Thread(target=self._embed_loop, name="ingest-embed", daemon=True)
+        self._embedder.start()
+
+    # ----------------- Job API -----------------
+    def submit(self, path):
+        """Queue a file; returns the existing job if this version of it is already queued or running"""
+        path = os.path.abspath(path)
+        digest = file_hash(path)
+        with self._cond:
+            for job in self._jobs.values():
+                if job.active and source_key(job.path) == source_key(path) and job.digest == digest:
+                    return job
+            job = IngestJob(path, digest)
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+        self._pool.submit(self._extract, job)
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """Ask a job to stop; returns the job (None if unknown)"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return job
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+            self._cond.notify_all()
+        return job
+
+    def stats(self):
+        with self._cond:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"jobs": counts, "pending_chunks": len(self._pending), "embedding_batches": self.batches}
+
+    def shutdown(self):
+        for job in self.jobs():
+            self.cancel(job.id)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._pool.shutdown(wait=True)
+        self._embedder.join()
+
+    def _forget_old_jobs(self):
+        finished = [job for job in self._jobs.values() if not job.active]
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+    def _finish(self, job, status, error=None):
+        job.status = status
+        job.phase = "finished"
+        job.error = error
+        job.finished_at = time.time()
+        self._cond.notify_all()
+
+    # ----------------- Extraction (worker threads) -----------------
+    def _extract(self, job):
+        with self._cond:
+            if job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.phase = "extracting"
+            job.started_at = time.time()
+
+        try:
+            self.manifest.refresh()
+            if self.manifest.known_hash(job.path) == job.digest:
+                with self._cond:
+                    job.extracted = True
+                    self._finish(job, DONE)
+                return
+
+            source = source_key(job.path)
+            existing = self.manifest.known_chunks(job.path)
+            seen = set()
+            for _, chunk in stream_chunks(iter_text(job.path), self.text_splitter, CHUNK_SIZE):
+                if job.cancelled:
+                    break
+                cid = chunk_id(source, chunk)
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                job.ids.append(cid)
+                job.chunks += 1
+                if cid in existing:
+                    continue
+                with self._cond:
+                    while len(self._pending) >= MAX_PENDING_CHUNKS and not job.cancelled and not self._stopping:
+                        self._cond.wait(0.1)
+                    job.new_chunks += 1
+                    self._pending.append((job, cid, chunk))
+                    self._cond.notify_all()
+
+            with self._cond:
+                job.stale_ids = sorted(existing - seen)
+                job.extracted = True
+                job.phase = "embedding"
+                self._cond.notify_all()
+        except Exception as e:
+            print(f"Error ingesting {job.path}: {e}")
+            with self._cond:
+                job._cancel.set()
+                job.error = str(e)
+                job.extracted = True
+                self._cond.notify_all()
+
+    # ----------------- Embedding (one thread) -----------------
+    def _take_batch(self):
+        """Up to batch_size pending chunks across all jobs, or [] when only bookkeeping is due"""
+        with self._cond:
+            while not self._stopping and not self._pending and not self._jobs_to_close():
+                self._cond.wait()
+            if self._pending and len(self._pending) < self.batch_size:
+                # Jobs still extracting will soon add more: wait briefly for a fuller batch
+                deadline = time.monotonic() + BATCH_WAIT_MS / 1000
+                while (len(self._pending) < self.batch_size and self._extracting()
+                       and (remaining := deadline - time.monotonic()) > 0):
+                    self._cond.wait(remaining)
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                item = self._pending.popleft()
+                if not item[0].cancelled:
+                    batch.append(item)
+            self._cond.notify_all()
+            return batch
+
+    def _extracting(self):
+        return any(job.status == RUNNING and not job.extracted for job in self._jobs.values())
+
+    def _jobs_to_close(self):
+        """Running jobs that are fully read and have nothing left queued (or were cancelled)"""
+        queued = {id(item[0]) for item in self._pending}
+        return [job for job in self._jobs.values()
+                if job.status == RUNNING and job.extracted and id(job) not in queued
+                and (job.cancelled or job.embedded == job.new_chunks)]
+
+    def _embed_loop(self):
+        vectorstore = get_vectorstore(self.embedding_model, self.db_path)
+        lexical = open_for_update(self.db_path)
+        while True:
+            with self._cond:
+                if self._stopping and not self._pending and not self._jobs_to_close():
+                    return
+            batch = self._take_batch()
+            try:
+                if batch:
+                    texts = [text for _, _, text in batch]
+                    ids = [cid for _, cid, _ in batch]
+                    metadatas = [{"source": job.path} for job, _, _ in batch]
+                    vectorstore.add_texts(texts, metadatas=metadatas, ids=ids)
+                    lexical.add(ids, texts, metadatas)
+                    self.batches += 1
+                    with self._cond:
+                        for job, cid, _ in batch:
+                            job.embedded += 1
+                            job.written_ids.append(cid)
+            except Exception as e:
+                print(f"Error embedding ingestion batch: {e}")
+                with self._cond:
+                    for job, _, _ in batch:
+                        job._cancel.set()
+                        job.error = str(e)
+            try:
+                if self._close_jobs(vectorstore, lexical):
+                    # save_index made our copy the one searches read: keep writing to a fresh one
+                    lexical = open_for_update(self.db_path)
+            except Exception as e:
+                print(f"Error saving ingested documents: {e}")
+                with self._cond:
+                    for job in self._jobs_to_close():
+                        self._finish(job, FAILED, str(e))
+
+    def _close_jobs(self, vectorstore, lexical):
+        """Record finished jobs in the manifest, roll back cancelled ones, then persist once.
+
+        Returns True if the BM25 index was saved.
+        """
+        with self._cond:
+            closing = self._jobs_to_close()
+        if not closing:
+            return False
+
+        changed = False
+        for job in closing:
+            if job.cancelled:
+                if job.written_ids:
+                    vectorstore.delete(ids=job.written_ids)
+                    lexical.delete(job.written_ids)
+                    changed = True
+            elif job.stale_ids:
+                vectorstore.delete(ids=job.stale_ids)
+                lexical.delete(job.stale_ids)
+            changed = changed or bool(job.written_ids or job.stale_ids)
+
+        # Same order as store_embeddings: vectors and BM25 first, then the manifest
+        if changed:
+            persist_vectorstore(vectorstore)
+            save_index(lexical, self.db_path)
+        for job in closing:
+            if not job.cancelled:
+                self.manifest.record(job.path, job.digest, job.ids)
+        self.manifest.save()
+        if changed:
+            bump_collection_version(self.db_path)
+
+        with self._cond:
+            for job in closing:
+                if job.error:
+                    self._finish(job, FAILED, job.error)
+                elif job.cancelled:
+                    self._finish(job, CANCELLED)
+                else:
+                    self._finish(job, DONE)
+        return changed
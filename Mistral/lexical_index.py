@@ -0,0 +1,270 @@
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+import common_path  # noqa: F401  (rag_common on sys.path)
+from rag_common.file_lock import FileLock
+
+# BM25 inverted index kept next to a Chroma collection (db_path/bm25_index.pkl).
+# store_embeddings and ingest.py update it with the same chunk ids as the
+# vector store, so keyword lookups never need an embedding or HNSW search.
+#
+# HybridRetriever exposes it to LangChain in three modes:
+#   "lexical" - BM25 only (no transformer forward pass at all)
+#   "hybrid"  - dense + BM25 candidates fused with reciprocal rank fusion
+#   "dense"   - plain vector search, same as vectorstore.as_retriever()
+
+INDEX_FILE = "bm25_index.pkl"
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lower-cased word tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Incremental BM25 index over chunks, keyed by the same ids as the vector store"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}       # id -> (text, metadata, length)
+        self.postings = {}   # term -> {id: term frequency}
+        self.total_length = 0
+        self._log = None     # unsaved ("add"/"delete", args...) when opened for update
+        self._stamp = None   # version of the file this copy was read from
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_log", None)
+        state.pop("_stamp", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._log = None
+        self._stamp = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, ids, texts, metadatas=None):
+        """Add or replace chunks"""
+        metadatas = metadatas or [{}] * len(ids)
+        if self._log is not None:
+            self._log.append(("add", list(ids), list(texts), list(metadatas)))
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            if doc_id in self.docs:
+                self._remove(doc_id)
+            counts = Counter(tokenize(text))
+            length = sum(counts.values())
+            self.docs[doc_id] = (text, metadata or {}, length)
+            self.total_length += length
+            for term, tf in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+
+    def delete(self, ids):
+        """Remove chunks (unknown ids are ignored)"""
+        if self._log is not None:
+            self._log.append(("delete", list(ids)))
+        for doc_id in ids:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        text, _, length = entry
+        self.total_length -= length
+        for term in set(tokenize(text)):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query, k=3):
+        """Top-k (id, score) pairs for a query"""
+        if not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                length = self.docs[doc_id][2]
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def document(self, doc_id):
+        """LangChain Document for a chunk id"""
+        text, metadata, _ = self.docs[doc_id]
+        return Document(page_content=text, metadata=metadata, id=doc_id)
+
+    def save(self, db_path):
+        """Write the index atomically to db_path"""
+        os.makedirs(db_path, exist_ok=True)
+        path = os.path.join(db_path, INDEX_FILE)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+
+# ----------------- Loading -----------------
+# Readers share one loaded copy per db_path. Writers take a private copy
+# (open_for_update), change it and swap it in with save_index, so a search
+# running in another thread never sees a half-updated index.
+#
+# A private copy logs its changes. save_index holds a lock file while it
+# re-reads the index if another process saved it since the copy was opened,
+# replays the log on that version and writes the result, so concurrent
+# writers never drop each other's chunks.
+_lock = threading.Lock()
+_loaded = {}  # abs db_path -> (mtime, BM25Index)
+
+
+def _stamp(st):
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return BM25Index()
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def load_index(db_path="chroma_db"):
+    """BM25 index for a db_path, reloaded only when the file changed on disk"""
+    path = os.path.join(db_path, INDEX_FILE)
+    key = os.path.abspath(db_path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    with _lock:
+        cached = _loaded.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        index = _read(path)
+        _loaded[key] = (mtime, index)
+        return index
+
+
+def open_for_update(db_path="chroma_db"):
+    """Private copy of the index to modify and then pass to save_index"""
+    path = os.path.join(db_path, INDEX_FILE)
+    try:
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+            index._stamp = _stamp(os.fstat(f.fileno()))
+    except FileNotFoundError:
+        index = BM25Index()
+    index._log = []
+    return index
+
+
+def save_index(index, db_path="chroma_db"):
+    """Persist an index (merged with what other processes saved meanwhile) and keep it as the loaded copy"""
+    path = os.path.join(db_path, INDEX_FILE)
+    with FileLock(path + ".lock"):
+        if index._log is not None:
+            try:
+                with open(path, "rb") as f:
+                    changed = _stamp(os.fstat(f.fileno())) != index._stamp
+                    latest = pickle.load(f) if changed else None
+            except FileNotFoundError:
+                latest = None
+            if latest is not None:
+                # Another process saved since this copy was opened: apply our changes to its version
+                for op, *args in index._log:
+                    getattr(latest, op)(*args)
+                index.docs, index.postings, index.total_length = latest.docs, latest.postings, latest.total_length
+        with _lock:
+            index.save(db_path)
+            st = os.stat(path)
+            _loaded[os.path.abspath(db_path)] = (st.st_mtime_ns, index)
+        if index._log is not None:
+            index._log = []
+            index._stamp = _stamp(st)
+
+
+def build_index(vectorstore, db_path="chroma_db"):
+    """(Re)build the BM25 index from everything in a Chroma collection"""
+    data = vectorstore.get(include=["documents", "metadatas"])
+    index = BM25Index()
+    index.add(data["ids"], data["documents"], data["metadatas"])
+    save_index(index, db_path)
+    print(f"✅ Built BM25 index for {len(index)} chunks")
+    return index
+
+
+def ensure_index(vectorstore, db_path="chroma_db"):
+    """Build the BM25 index from an existing Chroma collection if it was never built"""
+    if os.path.exists(os.path.join(db_path, INDEX_FILE)):
+        return load_index(db_path)
+    return build_index(vectorstore, db_path)
+
+
+# ----------------- Retriever -----------------
+class HybridRetriever(BaseRetriever):
+    """Retriever combining the Chroma collection with its BM25 index"""
+
+    vectorstore: object
+    db_path: str = "chroma_db"
+    mode: str = "hybrid"
+    k: int = 3
+    fetch_k: int = 10  # candidates taken from each side before fusion
+    rrf_k: int = 60
+
+    def search(self, query, query_vector=None):
+        """Retrieve documents; pass query_vector to reuse an already computed embedding"""
+        if self.mode == "dense":
+            return self._dense(query, query_vector, self.k)
+
+        index = load_index(self.db_path)
+        if self.mode == "lexical":
+            return [index.document(doc_id) for doc_id, _ in index.search(query, self.k)]
+
+        # Reciprocal rank fusion: score = sum over rankings of 1 / (rrf_k + rank)
+        fused, docs = {}, {}
+        for rank, doc in enumerate(self._dense(query, query_vector, self.fetch_k)):
+            fused[doc.page_content] = fused.get(doc.page_content, 0.0) + 1 / (self.rrf_k + rank + 1)
+            docs.setdefault(doc.page_content, doc)
+        for rank, (doc_id, _) in enumerate(index.search(query, self.fetch_k)):
+            doc = index.document(doc_id)
+            fused[doc.page_content] = fused.get(doc.page_content, 0.0) + 1 / (self.rrf_k + rank + 1)
+            docs.setdefault(doc.page_content, doc)
+
+        best = heapq.nlargest(self.k, fused.items(), key=lambda item: item[1])
+        return [docs[content] for content, _ in best]
+
+    def _dense(self, query, query_vector, k):
+        if query_vector is not None:
+            return self.vectorstore.similarity_search_by_vector(query_vector, k=k)
+        return self.vectorstore.similarity_search(query, k=k)
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.search(query)
+
+
+if __name__ == "__main__":
+    # Rebuild the index from the existing "documents" collection
+    from document_loader import embedding_model
+    from vectorstore_registry import get_vectorstore
+
+    build_index(get_vectorstore(embedding_model, "chroma_db"), "chroma_db")
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+
+import common_path  # noqa: F401  (rag_common on sys.path)
+from rag_common.file_lock import FileLock
+
+# The manifest lives next to the ChromaDB files and remembers, for every
+# ingested file, its content hash and the ids of the chunks it produced.
+# Chunk ids are derived from the source path and the chunk text, so the
+# same chunk always maps to the same vector and re-ingesting is idempotent.
+#
+# Several processes can ingest into one collection: save() holds a lock file
+# while it re-reads the manifest and writes it back with this process's new
+# records on top, so a long-lived manifest never overwrites entries another
+# process recorded after it was loaded.
+
+MANIFEST_FILE = "ingest_manifest.json"
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text):
+    """SHA-256 of a chunk's text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source, text):
+    """Stable vector id for a chunk of a given source file"""
+    source_key = hashlib.sha256((source or "").encode("utf-8")).hexdigest()[:16]
+    return f"{source_key}-{chunk_hash(text)[:32]}"
+
+
+def source_key(path):
+    """Normalise a file path so the same file always gets the same manifest entry"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class IngestManifest:
+    """File and chunk hashes of everything already embedded in a collection"""
+
+    def __init__(self, db_path="chroma_db"):
+        self.path = os.path.join(db_path, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(self.path + ".lock")
+        self._recorded = {}  # entries recorded since the last save
+        self.files, self._stamp = self._read()
+
+    def _read(self):
+        """(files, stamp) of the manifest on disk, ({}, None) if there is none"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                st = os.fstat(f.fileno())
+                return json.load(f).get("files", {}), (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            return {}, None
+
+    def refresh(self):
+        """Pick up entries other processes saved since the manifest was read (unsaved records are kept)"""
+        files, stamp = self._read()
+        with self._lock:
+            if stamp != self._stamp:
+                files.update(self._recorded)
+                self.files, self._stamp = files, stamp
+
+    def known_hash(self, source):
+        """File hash recorded for a source, or None if it was never ingested"""
+        with self._lock:
+            entry = self.files.get(source_key(source))
+            return entry["hash"] if entry else None
+
+    def known_chunks(self, source):
+        """Chunk ids recorded for a source (empty if it was never ingested)"""
+        with self._lock:
+            entry = self.files.get(source_key(source))
+            return set(entry["chunks"]) if entry else set()
+
+    def is_unchanged(self, source, digest=None):
+        """True if the file was ingested before and its contents have not changed"""
+        known = self.known_hash(source)
+        if known is None:
+            return False
+        return known == (digest or file_hash(source))
+
+    def plan(self, source, texts):
+        """Work out what to write for a new version of a file.
+
+        Returns (ids, new_ids, new_texts, stale_ids): the ids of every chunk in
+        the new version, the chunks that are not embedded yet, and the chunks
+        of the previous version that no longer exist.
+        """
+        ids, new_ids, new_texts = [], [], []
+        seen = set()
+        with self._lock:
+            entry = self.files.get(source_key(source))
+            existing = set(entry["chunks"]) if entry else set()
+
+        for text in texts:
+            cid = chunk_id(source_key(source), text)
+            if cid in seen:
+                continue
+            seen.add(cid)
+            ids.append(cid)
+            if cid not in existing:
+                new_ids.append(cid)
+                new_texts.append(text)
+
+        stale_ids = sorted(existing - seen)
+        return ids, new_ids, new_texts, stale_ids
+
+    def record(self, source, digest, ids):
+        """Remember the hash and chunk ids of the version just ingested"""
+        with self._lock:
+            entry = {"hash": digest, "chunks": list(ids)}
+            self.files[source_key(source)] = entry
+            self._recorded[source_key(source)] = entry
+
+    def save(self):
+        """Write the manifest atomically, on top of what other processes saved meanwhile"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with self._file_lock:
+            files, stamp = self._read()
+            with self._lock:
+                if stamp != self._stamp:
+                    files.update(self._recorded)
+                    self.files = files
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"files": self.files}, f)
+                os.replace(tmp_path, self.path)
+                st = os.stat(self.path)
+                self._stamp = st.st_mtime_ns, st.st_size, st.st_ino
+                self._recorded = {}
@@ -0,0 +1,278 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Latency instrumentation for the RAG path, exposed by app.py on /metrics
+# in the Prometheus text format (no client library needed).
+#
+#   span("embed")          - times a stage into rag_stage_duration_seconds{stage="embed"}
+#   StageTimingHandler()   - LangChain callback timing the RetrievalQA stages
+#                            (retrieve, prompt, generate) of qa_chain / combine_documents_chain
+#   record_generation(...) - token counts and tokens/sec from Ollama's response fields
+#   trace(query, endpoint) - groups the spans of one request; requests slower than
+#                            SLOW_QUERY_MS are appended to SLOW_QUERY_LOG (JSON lines)
+#                            with their stage timings and retrieved chunk ids
+#
+# The slow query log is off unless SLOW_QUERY_LOG is set to a file path.
+
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "2000"))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+
+
+# ----------------- Metrics -----------------
+_registry = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """Value read from a function at scrape time"""
+
+    def __init__(self, name, help, fn):
+        self.name, self.help, self.fn = name, help, fn
+        _registry.append(self)
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.fn()}"]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram("rag_request_duration_seconds", "End-to-end request latency", labelnames=("endpoint",))
+STAGE_SECONDS = Histogram("rag_stage_duration_seconds", "Latency of each RAG stage", labelnames=("stage",))
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Tokens processed by the LLM (prompt / completion)", ("kind",))
+LLM_TOKENS_PER_SECOND = Histogram("rag_llm_tokens_per_second", "Generation speed reported by Ollama",
+                                  TOKEN_RATE_BUCKETS)
+RETRIEVED_CHUNKS = Counter("rag_retrieved_chunks_total", "Chunks retrieved as context")
+SLOW_QUERIES = Counter("rag_slow_queries_total", f"Requests slower than SLOW_QUERY_MS ({SLOW_QUERY_MS:g} ms)")
+
+
+# ----------------- Tracing -----------------
+class Trace:
+    """Stage timings, chunk ids and token counts of one request"""
+
+    def __init__(self, query, endpoint):
+        self.query = query
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.chunk_ids = []
+        self.tokens = {}
+        self.cache = None  # "exact" / "similar" when answered from the answer cache
+
+    def to_dict(self, seconds):
+        return {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "endpoint": self.endpoint,
+            "query": self.query,
+            "total_ms": round(seconds * 1000, 1),
+            "stages_ms": {stage: round(value * 1000, 1) for stage, value in self.stages.items()},
+            "chunk_ids": self.chunk_ids,
+            "tokens": self.tokens,
+            "cache": self.cache,
+        }
+
+
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+_log_lock = threading.Lock()
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(query, endpoint):
+    """Trace one request; spans and records made inside it (or given the trace) are attached to it"""
+    current = Trace(query, endpoint)
+    previous = _current_trace.get()
+    _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        # set() rather than reset(token): streaming generators may finish in another context
+        _current_trace.set(previous)
+        seconds = time.perf_counter() - current.started
+        REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+        if seconds * 1000 >= SLOW_QUERY_MS:
+            SLOW_QUERIES.inc()
+            if SLOW_QUERY_LOG:
+                _write_slow_query(current.to_dict(seconds))
+
+
+def _write_slow_query(entry):
+    try:
+        with _log_lock, open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Error writing slow query log {SLOW_QUERY_LOG}: {e}")
+
+
+def observe_stage(stage, seconds, trace=None):
+    """Record a stage duration measured elsewhere"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.stages[stage] = trace.stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage, trace=None):
+    """Time the enclosed block as one RAG stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, trace)
+
+
+def record_chunks(docs, trace=None):
+    """Remember which chunks were retrieved as context"""
+    RETRIEVED_CHUNKS.inc(len(docs))
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.chunk_ids.extend(doc.id or doc.metadata.get("source", "?") for doc in docs)
+
+
+def record_generation(info, trace=None):
+    """Token counts and tokens/sec from Ollama's final response (eval_count, eval_duration, ...)"""
+    if not info:
+        return
+    prompt_tokens = info.get("prompt_eval_count") or 0
+    completion_tokens = info.get("eval_count") or 0
+    LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, kind="completion")
+    tokens_per_sec = None
+    if completion_tokens and info.get("eval_duration"):
+        tokens_per_sec = completion_tokens / (info["eval_duration"] / 1e9)
+        LLM_TOKENS_PER_SECOND.observe(tokens_per_sec)
+
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.tokens = {
+            "prompt": prompt_tokens,
+            "completion": completion_tokens,
+            "tokens_per_sec": round(tokens_per_sec, 1) if tokens_per_sec else None,
+        }
+
+
+class StageTimingHandler(BaseCallbackHandler):
+    """Times the RetrievalQA stages: retrieve, prompt (stuffing documents) and generate"""
+
+    run_inline = True
+
+    def __init__(self, trace=None):
+        self.trace = trace or _current_trace.get()
+        self._starts = {}
+
+    def _start(self, run_id):
+        self._starts[run_id] = time.perf_counter()
+
+    def _end(self, run_id, stage):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            observe_stage(stage, time.perf_counter() - start, self.trace)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, "retrieve")
+        record_chunks(documents, self.trace)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        # The stuff-documents chain formats the retrieved chunks into the prompt
+        if "input_documents" in (inputs if isinstance(inputs, dict) else {}):
+            self._starts[("prompt", run_id)] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        prompt_starts = [key for key in self._starts if isinstance(key, tuple) and key[0] == "prompt"]
+        for key in prompt_starts:
+            observe_stage("prompt", time.perf_counter() - self._starts.pop(key), self.trace)
+        self._start(run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id, "generate")
+        for generations in response.generations:
+            for generation in generations:
+                record_generation(generation.generation_info, self.trace)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._starts.pop(("prompt", run_id), None)
@@ -0,0 +1,35 @@
+import os
+
+import common_path  # noqa: F401  (rag_common on sys.path)
+from rag_common.embedding_cache import CachedEmbeddings
+
+# Model settings shared by document_loader.py, app.py and ollama_client.py.
+# Defaults match the original setup; the environment variables let the same
+# code run against another Ollama host (e.g. benchmarks/fake_ollama.py).
+#
+#   OLLAMA_HOST          Ollama base URL
+#   LLM_MODEL            Ollama model used for answers
+#   EMBEDDING_MODEL      HuggingFace model name, or "ollama/<model>" for Ollama embeddings
+#   EMBEDDING_CACHE_DIR  where CachedEmbeddings keeps its vectors
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+LLM_MODEL_NAME = os.getenv("LLM_MODEL", "mistral")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+
+
+def load_embedding_model():
+    """Embeddings model (vectors are cached on disk, see rag_common/embedding_cache.py)"""
+    if EMBEDDING_MODEL_NAME.startswith("ollama/"):
+        from langchain_ollama import OllamaEmbeddings
+        embeddings = OllamaEmbeddings(model=EMBEDDING_MODEL_NAME[len("ollama/"):], base_url=OLLAMA_HOST)
+    else:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    return CachedEmbeddings(embeddings, model_name=EMBEDDING_MODEL_NAME, cache_dir=EMBEDDING_CACHE_DIR)
+
+
+def load_llm():
+    """Mistral (or LLM_MODEL) through Ollama"""
+    from langchain_ollama import OllamaLLM
+    return OllamaLLM(model=LLM_MODEL_NAME, base_url=OLLAMA_HOST)
@@ -0,0 +1,62 @@
+import json
+
+import requests
+
+from metrics import record_generation, span
+from models import LLM_MODEL_NAME, OLLAMA_HOST
+
+OLLAMA_API_URL = f"{OLLAMA_HOST}/api/generate"
+
+# One pooled HTTP session for all calls to Ollama, so requests reuse the
+# same keep-alive connection instead of opening a new one every time.
+ollama_session = requests.Session()
+
+
+def build_rag_prompt(context, query):
+    """Prompt used to answer a question from retrieved documents"""
+    return f"""
+    You are an AI assistant with access to the following information:
+
+    {context}
+
+    Based on this, answer the following question:
+    {query}
+    """
+
+
+def generate_ai_response(context, query):
+    """Send user query along with retrieved documents to Mistral AI for RAG"""
+    #A payload is just the data you send to a web API in a request.
+    #Think of it as the message or instructions you give to the server.
+    payload = {
+        "model": LLM_MODEL_NAME,  # which AI model to use (mistral)
+        "prompt": build_rag_prompt(context, query),  # the text you want the AI to respond to
+        "stream": False  # do you want the response streamed in real-time? False = wait for full answer
+    }
+    with span("generate"):
+        data = ollama_session.post(OLLAMA_API_URL, json=payload).json()
+    # Ollama also reports token counts and timings (eval_count, eval_duration, ...)
+    record_generation(data)
+
+    return data.get("response", "No response generated.")
+
+
+def stream_ai_response(context, query, trace=None):
+    """Same as generate_ai_response, but yields tokens as Mistral produces them"""
+    payload = {
+        "model": LLM_MODEL_NAME,
+        "prompt": build_rag_prompt(context, query),
+        "stream": True  # Ollama answers with one JSON object per line (NDJSON)
+    }
+    with span("generate", trace), ollama_session.post(OLLAMA_API_URL, json=payload, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                # The last object carries the token counts and timings
+                record_generation(data, trace)
+                break
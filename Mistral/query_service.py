@@ -0,0 +1,228 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import common_path  # noqa: F401  (rag_common on sys.path)
+from rag_common.context_builder import select_context
+from metrics import StageTimingHandler, current_trace, observe_stage, record_chunks, span
+
+# Async RAG path used by the /query endpoint:
+#
+#   identical in-flight queries  -> QueryCoalescer (one computation, shared result)
+#   query embedding              -> EmbeddingBatcher (one embed_documents call per few-ms window)
+#   Mistral generation           -> LLMLimiter (semaphore-capped, with queueing stats;
+#                                   app.py's /query/stream takes its slots too)
+#
+# An optional AnswerCache (answer_cache.py) is checked before any of this,
+# and again by embedding similarity once the query vector is known.
+# Each stage is timed with metrics.span (embed, retrieve, llm_queue, prompt, generate).
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query, used as a coalescing/cache key"""
+    return " ".join(query.lower().split())
+
+
+class QueryCoalescer:
+    """Lets identical queries that are in flight at the same time share one computation"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def run(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # Shielded so one client disconnecting does not cancel the others' answer
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"inflight": len(self._inflight), "coalesced": self.coalesced}
+
+
+class EmbeddingBatcher:
+    """Groups query embeddings arriving within a short window into one embed_documents batch"""
+
+    def __init__(self, embedding_model, window_ms=5, max_batch_size=32):
+        self.embedding_model = embedding_model
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._timer = None
+        self._tasks = set()  # the event loop only keeps weak references to running tasks
+        self.batches = 0
+        self.embedded = 0
+
+    async def embed(self, text):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._embed_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed_batch(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            vectors = await asyncio.to_thread(self.embedding_model.embed_documents, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.embedded += len(batch)
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "embedded": self.embedded,
+            "avg_batch_size": round(self.embedded / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class LLMLimiter:
+    """Caps the number of concurrent LLM calls and records how long callers queue"""
+
+    def __init__(self, max_concurrency=2):
+        self.max_concurrency = max_concurrency
+        self._semaphore = None  # created on first use, inside the server's event loop
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - start
+        observe_stage("llm_queue", waited)
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "avg_wait_seconds": round(self.total_wait / self.completed, 4) if self.completed else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+        }
+
+
+class RAGQueryService:
+    """Async retrieval + generation with the same prompt as the RetrievalQA chain"""
+
+    def __init__(self, qa_chain, vectorstore, embedding_model, k=3, max_llm_concurrency=2, batch_window_ms=5,
+                 answer_cache=None):
+        self.combine_documents_chain = qa_chain.combine_documents_chain
+        # A HybridRetriever (lexical_index.py) can reuse our batched query vector;
+        # in "lexical" mode the query does not need to be embedded at all.
+        retriever = qa_chain.retriever
+        self.retriever = retriever if hasattr(retriever, "search") else None
+        self.vectorstore = vectorstore
+        self.k = k
+        self.coalescer = QueryCoalescer()
+        self.batcher = EmbeddingBatcher(embedding_model, window_ms=batch_window_ms)
+        self.limiter = LLMLimiter(max_llm_concurrency)
+        self.answer_cache = answer_cache
+
+    async def answer(self, query):
+        """Answer a query, sharing work with identical queries already in flight"""
+        if self.answer_cache is not None:
+            cached = self.answer_cache.get(query)
+            if cached is not None:
+                self._mark_cached("exact")
+                return cached
+        return await self.coalescer.run(normalize_query(query), lambda: self._answer(query))
+
+    async def _answer(self, query):
+        cache = self.answer_cache
+        version = cache.current_version() if cache is not None else None
+
+        vector = None
+        if self._needs_vector():
+            with span("embed"):  # includes the few ms spent waiting for the batch window
+                vector = await self.batcher.embed(query)
+        if cache is not None and vector is not None:
+            cached = cache.get_similar(vector)
+            if cached is not None:
+                self._mark_cached("similar")
+                return cached
+
+        with span("retrieve"):
+            if self.retriever is not None:
+                docs = await asyncio.to_thread(self.retriever.search, query, vector)
+            else:
+                docs = await asyncio.to_thread(self.vectorstore.similarity_search_by_vector, vector, self.k)
+        record_chunks(docs)
+        # Drop repeated/overlapping chunks and fit the context to the token budget
+        docs = select_context(docs, query)
+        async with self.limiter.slot():
+            output = await self.combine_documents_chain.ainvoke(
+                {"input_documents": docs, "question": query},
+                config={"callbacks": [StageTimingHandler()]}
+            )
+
+        answer = output["output_text"]
+        if cache is not None:
+            cache.put(query, answer, vector=vector, version=version)
+        return answer
+
+    @staticmethod
+    def _mark_cached(kind):
+        trace = current_trace()
+        if trace is not None:
+            trace.cache = kind
+
+    def _needs_vector(self):
+        if self.retriever is None or self.retriever.mode != "lexical":
+            return True
+        return self.answer_cache is not None and self.answer_cache.similarity_threshold is not None
+
+    def stats(self):
+        return {
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None,
+            "coalescing": self.coalescer.stats(),
+            "embedding_batches": self.batcher.stats(),
+            "llm": self.limiter.stats(),
+        }
@@ -0,0 +1,175 @@
+import bisect
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF for PDFs
+import docx
+
+
+# Kept free of model/vector store imports so worker processes
+# (see ingest.py) can import it without loading the embeddings model.
+#
+# The iter_* functions yield (page or paragraph number, text) one piece at a
+# time, so a 2,000-page manual never has to sit in memory as one string and
+# splitting can start while extraction is still running (see stream_chunks).
+# Each piece carries its own trailing separator: pages and paragraphs end with
+# "\n", TXT blocks (cut at arbitrary characters) with nothing, so joining the
+# pieces always gives exactly the extract_text output.
+
+PAGES_PER_TASK = 50          # pages handed to one worker process at a time
+PARALLEL_MIN_PAGES = 200     # smaller PDFs are not worth the process start-up cost
+TXT_BLOCK_SIZE = 1 << 16     # characters read per block from TXT files
+
+
+def _extract_pdf_range(pdf_path, start, stop):
+    """Worker: text of pages [start, stop) of a PDF"""
+    with fitz.open(pdf_path) as doc:
+        return [(number + 1, doc[number].get_text("text") + "\n") for number in range(start, stop)]
+
+
+def iter_pdf_pages(pdf_path, workers=None):
+    """Yield (page number, text) for each page of a PDF.
+
+    With workers > 1, PDFs of PARALLEL_MIN_PAGES pages or more are split into
+    page ranges extracted by that many processes; pages still come out in order.
+    """
+    try:
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+            if not workers or workers < 2 or page_count < PARALLEL_MIN_PAGES:
+                for number, page in enumerate(doc, start=1):
+                    yield number, page.get_text("text") + "\n"
+                return
+
+        ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Only keep a couple of ranges per worker in flight to bound memory
+            window = workers * 2
+            futures = [pool.submit(_extract_pdf_range, pdf_path, *r) for r in ranges[:window]]
+            for i in range(len(ranges)):
+                pages = futures[i].result()
+                futures[i] = None
+                if i + window < len(ranges):
+                    futures.append(pool.submit(_extract_pdf_range, pdf_path, *ranges[i + window]))
+                yield from pages
+    except Exception as e:
+        print(f"Error reading PDF {pdf_path}: {e}")
+
+
+def iter_word_paragraphs(doc_path):
+    """Yield (paragraph number, text) for each paragraph of a Word (.docx) file"""
+    try:
+        doc = docx.Document(doc_path)
+        for number, para in enumerate(doc.paragraphs, start=1):
+            yield number, para.text + "\n"
+    except Exception as e:
+        print(f"Error reading Word file {doc_path}: {e}")
+
+
+def iter_txt_blocks(txt_path):
+    """Yield (block number, text) for fixed-size blocks of a TXT file"""
+    try:
+        with open(txt_path, "r", encoding="utf-8") as file:
+            for number, block in enumerate(iter(lambda: file.read(TXT_BLOCK_SIZE), ""), start=1):
+                yield number, block
+    except Exception as e:
+        print(f"Error reading TXT file {txt_path}: {e}")
+
+
+def file_type(file_path):
+    """Lower-cased extension (".pdf", ".docx", ...), so REPORT.PDF is read like report.pdf"""
+    return os.path.splitext(file_path)[1].lower()
+
+
+def iter_text(file_path, workers=None):
+    """Detect file type and yield (page/paragraph/block number, text) pieces"""
+    extension = file_type(file_path)
+    if extension == ".pdf":
+        return iter_pdf_pages(file_path, workers=workers)
+    elif extension == ".docx":
+        return iter_word_paragraphs(file_path)
+    elif extension == ".txt":
+        return iter_txt_blocks(file_path)
+    else:
+        print(f"Unsupported file format: {file_path}")
+        return iter(())
+
+
+def stream_chunks(pieces, text_splitter, chunk_size, window=None):
+    """Split (number, text) pieces into (number, chunk) pairs without joining the whole document.
+
+    Text is buffered until it holds about `window` characters (chunk_size * 20
+    by default, chunk_size being the splitter's), then split; the last chunk is
+    carried over into the next window, so no text is lost and chunk sizes and
+    overlaps are kept across window boundaries. Each chunk is tagged with the
+    page/paragraph number it starts on.
+    """
+    window = window or chunk_size * 20
+    buffer, starts, numbers = "", [], []  # starts[i] = offset in buffer where piece numbers[i] begins
+
+    def locate(chunks):
+        offsets, position = [], 0
+        for chunk in chunks:
+            found = buffer.find(chunk, position)
+            offset = found if found >= 0 else position
+            offsets.append(offset)
+            position = offset + 1
+        return offsets
+
+    def number_at(offset):
+        return numbers[bisect.bisect_right(starts, offset) - 1]
+
+    for number, text in pieces:
+        starts.append(len(buffer))
+        numbers.append(number)
+        buffer += text
+        if len(buffer) < window:
+            continue
+
+        chunks = text_splitter.split_text(buffer)
+        if len(chunks) < 2:
+            continue
+        offsets = locate(chunks)
+        for chunk, offset in zip(chunks[:-1], offsets[:-1]):
+            yield number_at(offset), chunk
+
+        # Restart the buffer at the last (possibly unfinished) chunk
+        carry_from = offsets[-1]
+        kept = [(s - carry_from, n) for s, n in zip(starts, numbers) if s > carry_from]
+        starts = [0] + [s for s, _ in kept]
+        numbers = [number_at(carry_from)] + [n for _, n in kept]
+        buffer = buffer[carry_from:]
+
+    if buffer.strip():
+        chunks = text_splitter.split_text(buffer)
+        for chunk, offset in zip(chunks, locate(chunks)):
+            yield number_at(offset), chunk
+
+
+def extract_text_from_pdf(pdf_path, workers=None):
+    """Extract text from a PDF file"""
+    return "".join(text for _, text in iter_pdf_pages(pdf_path, workers=workers))
+
+
+def extract_text_from_word(doc_path):
+    """Extract text from a Word (.docx) file"""
+    return "".join(text for _, text in iter_word_paragraphs(doc_path))
+
+
+def extract_text_from_txt(txt_path):
+    """Extract text from a TXT file"""
+    return "".join(text for _, text in iter_txt_blocks(txt_path))
+
+
+def extract_text(file_path):
+    """Detect file type and extract text accordingly"""
+    extension = file_type(file_path)
+    if extension == ".pdf":
+        return extract_text_from_pdf(file_path)
+    elif extension == ".docx":
+        return extract_text_from_word(file_path)
+    elif extension == ".txt":
+        return extract_text_from_txt(file_path)
+    else:
+        print(f"Unsupported file format: {file_path}")
+        return ""
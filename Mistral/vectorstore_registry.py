@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+
+from langchain_community.vectorstores import Chroma
+from langchain.chains import RetrievalQA
+
+import common_path  # noqa: F401  (rag_common on sys.path)
+from lexical_index import HybridRetriever, ensure_index
+from rag_common.file_lock import FileLock
+from rag_common.numpy_store import NumpyVectorStore
+
+# Process-wide cache of Chroma clients, retrievers and RetrievalQA chains.
+# Opening a Chroma collection loads its sqlite + HNSW files, so every caller
+# with the same (db_path, collection, embedding model) shares one client.
+# Call invalidate() after another process rewrites a collection.
+#
+# Writers also bump a per-collection version number stored next to the
+# ChromaDB files, so caches in other processes (e.g. the answer cache in
+# app.py) can tell that the collection changed underneath them.
+#
+# VECTOR_BACKEND selects the store: "chroma" (default) or "numpy", a
+# brute-force store in a single db_path/<collection>.npvs file (see
+# rag_common/numpy_store.py), optionally quantized with VECTOR_QUANTIZATION=int8|binary.
+
+_lock = threading.RLock()
+_vectorstores = {}
+_retrievers = {}
+_qa_chains = {}
+
+VERSION_FILE = "collection_versions.json"
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION") or None
+
+
+def _model_name(obj):
+    """Best-effort model identifier for an embeddings object or LLM"""
+    return getattr(obj, "model_name", None) or getattr(obj, "model", None) or type(obj).__name__
+
+
+def _store_key(embedding_model, db_path, collection_name):
+    return (os.path.abspath(db_path), collection_name, _model_name(embedding_model), VECTOR_BACKEND)
+
+
+def get_vectorstore(embedding_model, db_path="chroma_db", collection_name="documents"):
+    """Shared Chroma client for a collection"""
+    key = _store_key(embedding_model, db_path, collection_name)
+    with _lock:
+        vectorstore = _vectorstores.get(key)
+        if vectorstore is None:
+            if VECTOR_BACKEND == "numpy":
+                vectorstore = NumpyVectorStore(
+                    embedding_model,
+                    path=os.path.join(db_path, f"{collection_name}.npvs"),
+                    quantization=VECTOR_QUANTIZATION
+                )
+            else:
+                vectorstore = Chroma(
+                    collection_name=collection_name,
+                    persist_directory=db_path,
+                    embedding_function=embedding_model
+                )
+            _vectorstores[key] = vectorstore
+        return vectorstore
+
+
+def persist_vectorstore(vectorstore):
+    """Flush writes to disk for backends that need it (Chroma persists on its own)"""
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.persist()
+
+
+def get_retriever(embedding_model, db_path="chroma_db", collection_name="documents", k=3, retrieval_mode="dense"):
+    """Shared top-k retriever over a collection.
+
+    retrieval_mode is "dense" (vector search), "hybrid" (vector + BM25 fused)
+    or "lexical" (BM25 only), see lexical_index.py.
+    """
+    key = _store_key(embedding_model, db_path, collection_name) + (k, retrieval_mode)
+    with _lock:
+        retriever = _retrievers.get(key)
+        if retriever is None:
+            vectorstore = get_vectorstore(embedding_model, db_path, collection_name)
+            if retrieval_mode == "dense":
+                retriever = vectorstore.as_retriever(search_kwargs={"k": k})
+            else:
+                ensure_index(vectorstore, db_path)
+                retriever = HybridRetriever(vectorstore=vectorstore, db_path=db_path, mode=retrieval_mode, k=k)
+            _retrievers[key] = retriever
+        return retriever
+
+
+def get_qa_chain(llm, embedding_model, db_path="chroma_db", collection_name="documents", k=3, retrieval_mode="dense"):
+    """Shared RetrievalQA chain for an LLM over a collection"""
+    key = _store_key(embedding_model, db_path, collection_name) + (k, retrieval_mode, _model_name(llm))
+    with _lock:
+        qa_chain = _qa_chains.get(key)
+        if qa_chain is None:
+            retriever = get_retriever(embedding_model, db_path, collection_name, k, retrieval_mode)
+            qa_chain = RetrievalQA.from_chain_type(llm=llm, retriever=retriever)
+            _qa_chains[key] = qa_chain
+        return qa_chain
+
+
+def invalidate(db_path=None, collection_name=None):
+    """Drop cached clients, retrievers and chains (all of them, or those of one db/collection)"""
+    db_path = os.path.abspath(db_path) if db_path else None
+    with _lock:
+        for cache in (_vectorstores, _retrievers, _qa_chains):
+            for key in list(cache):
+                if db_path is not None and key[0] != db_path:
+                    continue
+                if collection_name is not None and key[1] != collection_name:
+                    continue
+                del cache[key]
+
+
+def _read_versions(db_path):
+    path = os.path.join(db_path, VERSION_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def get_collection_version(db_path="chroma_db", collection_name="documents"):
+    """Number of recorded writes to a collection (0 if never written through store_embeddings/ingest)"""
+    return _read_versions(db_path).get(collection_name, 0)
+
+
+def bump_collection_version(db_path="chroma_db", collection_name="documents"):
+    """Record that a collection's contents changed; returns the new version"""
+    os.makedirs(db_path, exist_ok=True)
+    # The file lock keeps a bump from another process from being lost
+    with _lock, FileLock(os.path.join(db_path, VERSION_FILE + ".lock")):
+        versions = _read_versions(db_path)
+        versions[collection_name] = versions.get(collection_name, 0) + 1
+        os.makedirs(db_path, exist_ok=True)
+        tmp_path = os.path.join(db_path, VERSION_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(versions, f)
+        os.replace(tmp_path, os.path.join(db_path, VERSION_FILE))
+        return versions[collection_name]
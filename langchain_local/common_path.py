@@ -0,0 +1,9 @@
+import os
+import sys
+
+# context_builder, embedding_cache et numpy_store sont partagés avec Mistral et
+# se trouvent dans le package rag_common à la racine du dépôt ; importer ce
+# module le rend importable quel que soit le répertoire de lancement.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
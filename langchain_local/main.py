@@ -1,7 +1,18 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
 from langchain_ollama.llms import OllamaLLM
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
-from vector import retriever  # your Chroma retriever
+import common_path  # noqa: F401  (rag_common dans sys.path)
+from rag_common.context_builder import build_context
+from vector import LATEST_REVIEW_DATE, build_filter, embeddings, vector_store  # your Chroma store
 
 # Initialise le modèle Ollama
 model = OllamaLLM(model="llama3.2")
@@ -18,22 +29,203 @@ prompt = ChatPromptTemplate.from_template(template)
 # Crée la chaîne LLMChain
 chain = LLMChain(llm=model, prompt=prompt)
 
-# Invoque la chaîne
-while True:
-    print("\n-----------------")
-    question = input("Ask your question (q to quit): ")
-    if question.lower() == "q":
-        break
+# Mode batch: nombre d'appels LLM en parallèle (Ollama les traite selon OLLAMA_NUM_PARALLEL)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+TOP_K = 5
+
+
+# ----------------- Filtres déduits de la question -----------------
+RECENT_DAYS = 90  # "recent" = les 90 derniers jours avant l'avis le plus récent
+NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+MONTHS = {name: number for number, name in enumerate(
+    ["january", "february", "march", "april", "may", "june", "july",
+     "august", "september", "october", "november", "december"], start=1)}
+UNITS = {"day": "days", "week": "weeks", "month": "months", "year": "years"}
+
+_STARS = r"(\d|one|two|three|four|five)[\s-]*stars?"
+_MONTH = r"(" + "|".join(MONTHS) + r")"
+
+
+def _stars(match):
+    value = next(group for group in match.groups() if group)
+    return NUMBERS.get(value) or int(value)
+
+
+def parse_filters(question):
+    """Note et période demandées dans la question, ex: "recent 5-star reviews about crust"
+    -> {"min_rating": 5, "max_rating": 5, "start_date": ...}"""
+    text = question.lower()
+    filters = {}
 
-    # Get the top 5 relevant reviews
-    retrieved_docs = retriever.get_relevant_documents(question)
-    reviews_text = "\n".join([doc.page_content for doc in retrieved_docs])
+    # Notes
+    if m := re.search(rf"(?:at least|minimum)\s+{_STARS}|{_STARS}\s*(?:\+|and up|or more|or above|or better)"
+                      rf"|(\d)\s*\+\s*stars?", text):
+        filters["min_rating"] = _stars(m)
+    elif m := re.search(rf"(?:below|under|less than)\s+{_STARS}", text):
+        filters["max_rating"] = _stars(m) - 1
+    elif m := re.search(rf"(?:at most|maximum)\s+{_STARS}|{_STARS}\s*(?:or less|or below|or lower|or worse)", text):
+        filters["max_rating"] = _stars(m)
+    elif m := re.search(_STARS, text):
+        filters["min_rating"] = filters["max_rating"] = _stars(m)
+    elif re.search(r"\b(positive|good|great)\s+(reviews?|ratings?)", text):
+        filters["min_rating"] = 4
+    elif re.search(r"\b(negative|bad|poor|low[\s-]rated)\s+(reviews?|ratings?)|\bcomplaints?\b", text):
+        filters["max_rating"] = 2
 
-    # Pass the reviews to the chain
+    # Période, relative à l'avis le plus récent (les avis exportés ne vont pas jusqu'à aujourd'hui)
+    reference = pd.Timestamp(LATEST_REVIEW_DATE) if LATEST_REVIEW_DATE else pd.Timestamp.today().normalize()
+    if m := re.search(r"\b(?:last|past)\s+(\d+)\s+(day|week|month|year)s?", text):
+        filters["start_date"] = reference - pd.DateOffset(**{UNITS[m.group(2)]: int(m.group(1))})
+    elif re.search(r"\b(recent|recently|latest|newest)\b", text):
+        filters["start_date"] = reference - pd.Timedelta(days=RECENT_DAYS)
+    elif m := re.search(rf"\b(?:in|during)\s+{_MONTH}\s+(\d{{4}})", text):
+        filters["start_date"] = pd.Timestamp(year=int(m.group(2)), month=MONTHS[m.group(1)], day=1)
+        filters["end_date"] = filters["start_date"] + pd.offsets.MonthEnd(0)
+    elif m := re.search(r"\b(?:in|during)\s+(\d{4})\b", text):
+        filters["start_date"] = pd.Timestamp(year=int(m.group(1)), month=1, day=1)
+        filters["end_date"] = pd.Timestamp(year=int(m.group(1)), month=12, day=31)
+    else:
+        if m := re.search(r"\b(?:since|after|from)\s+(\d{4}-\d{2}-\d{2})", text):
+            filters["start_date"] = pd.Timestamp(m.group(1))
+        if m := re.search(r"\b(?:before|until)\s+(\d{4}-\d{2}-\d{2})", text):
+            filters["end_date"] = pd.Timestamp(m.group(1))
+    return filters
+
+
+def retrieve_reviews(question, query_vector=None):
+    """Top avis pour une question, en ne scorant que ceux qui passent ses filtres.
+
+    query_vector permet de réutiliser un embedding déjà calculé (mode batch).
+    Renvoie (documents, filtres).
+    """
+    if query_vector is None:
+        query_vector = embeddings.embed_query(question)
+
+    filters = parse_filters(question)
+    docs = []
+    if filters:
+        docs = vector_store.similarity_search_by_vector(query_vector, k=TOP_K, filter=build_filter(**filters))
+    if not docs:
+        # Aucun filtre, ou aucun avis ne correspond: recherche sur tous les avis
+        docs = vector_store.similarity_search_by_vector(query_vector, k=TOP_K)
+    return docs, filters
+
+
+def answer(question, docs):
+    """Réponse du LLM à partir des avis retrouvés"""
+    # Avis en double retirés et contexte limité au budget de tokens (voir rag_common/context_builder.py)
+    reviews_text = build_context(docs, question, separator="\n")
     result = chain.invoke({"reviews": reviews_text, "question": question})
+    return result.get("text", "") if isinstance(result, dict) else result
+
+
+def format_filters(filters):
+    return ", ".join(f"{key}={value.date() if isinstance(value, pd.Timestamp) else value}"
+                     for key, value in filters.items())
+
+
+# ----------------- Mode interactif -----------------
+def interactive():
+    # Invoque la chaîne
+    while True:
+        print("\n-----------------")
+        question = input("Ask your question (q to quit): ")
+        if question.lower() == "q":
+            break
+
+        # Get the top 5 relevant reviews, only scoring the ones that match the question's filters
+        retrieved_docs, filters = retrieve_reviews(question)
+        if filters:
+            print("🔹 Filtres:", format_filters(filters))
+
+        # Pass the reviews to the chain and print only the text
+        print("\nAnswer:\n", answer(question, retrieved_docs))
+
+
+# ----------------- Mode batch (JSONL) -----------------
+def read_questions(path):
+    """Questions d'un fichier JSONL ("-" = stdin): {"id": ..., "question": "..."} ou une simple chaîne JSON"""
+    source = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        questions = []
+        for number, line in enumerate(source, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            questions.append({"id": item.get("id", number), "question": item["question"]})
+        return questions
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+def _run_one(item, query_vector, submitted):
+    started = time.perf_counter()
+    record = {"id": item["id"], "question": item["question"]}
+    try:
+        docs, filters = retrieve_reviews(item["question"], query_vector)
+        retrieved = time.perf_counter()
+        record["answer"] = answer(item["question"], docs)
+        finished = time.perf_counter()
+        record["filters"] = format_filters(filters) or None
+        record["reviews"] = [doc.id for doc in docs]
+        record["timings_ms"] = {
+            "queued": round((started - submitted) * 1000, 1),
+            "retrieve": round((retrieved - started) * 1000, 1),
+            "llm": round((finished - retrieved) * 1000, 1),
+            "total": round((finished - submitted) * 1000, 1),
+        }
+    except Exception as e:
+        record["error"] = str(e)
+    return record
+
+
+def run_batch(questions_path, out_path, concurrency=BATCH_CONCURRENCY):
+    """Répond à toutes les questions; les résultats sont écrits en JSONL dans l'ordre où ils se terminent"""
+    questions = read_questions(questions_path)
+    if not questions:
+        print("No questions found", file=sys.stderr)
+        return
+
+    # Un seul appel d'embedding pour toutes les questions
+    start = time.perf_counter()
+    vectors = embeddings.embed_queries([item["question"] for item in questions])
+    embed_seconds = time.perf_counter() - start
+    print(f"🔹 {len(questions)} questions embedded in {embed_seconds:.2f}s", file=sys.stderr)
+
+    out = sys.stdout if out_path == "-" else open(out_path, "w", encoding="utf-8")
+    errors = 0
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            submitted = time.perf_counter()
+            futures = [pool.submit(_run_one, item, vector, submitted) for item, vector in zip(questions, vectors)]
+            for done, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                errors += "error" in record
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if done % 50 == 0:
+                    print(f"🔹 {done}/{len(questions)} answered", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    seconds = time.perf_counter() - start
+    print(f"✅ {len(questions)} questions in {seconds:.1f}s ({len(questions) / seconds:.2f} questions/s, "
+          f"concurrency {concurrency}, {errors} errors)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Questions sur les avis du restaurant")
+    parser.add_argument("--batch", metavar="QUESTIONS.jsonl", help="fichier de questions JSONL (\"-\" = stdin)")
+    parser.add_argument("--out", default="-", help="résultats JSONL (\"-\" = stdout, par défaut)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="appels LLM en parallèle")
+    args = parser.parse_args()
 
-    # Print only the text
-    if isinstance(result, dict):
-        print("\nAnswer:\n", result.get("text", ""))
+    if args.batch:
+        run_batch(args.batch, args.out, args.concurrency)
     else:
-        print("\nAnswer:\n", result)
+        interactive()
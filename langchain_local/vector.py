@@ -1,49 +1,215 @@
 from langchain_ollama import OllamaEmbeddings
 from langchain_chroma import Chroma
-from langchain.schema import Document  # <- corrected
+import common_path  # noqa: F401  (rag_common dans sys.path)
+from rag_common.embedding_cache import CachedEmbeddings
+from rag_common.numpy_store import NumpyVectorStore
 
 import os
+import sqlite3
+import sys
+import numpy as np
 import pandas as pd
 
-# Lire le CSV
-df = pd.read_csv("realistic_restaurant_reviews.csv")
-print("Columns in CSV:", df.columns)  # Check column names
+# Fichier d'avis (peut contenir des millions de lignes)
+CSV_PATH = os.getenv("REVIEWS_CSV", "realistic_restaurant_reviews.csv")
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "50000"))   # lignes lues à la fois
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))  # documents embarqués par appel
+COLUMNS = ["Title", "Date", "Rating", "Review"]
+METADATA_VERSION = "2"  # à incrémenter quand les métadonnées changent (force la réindexation)
 
-# Embeddings Ollama
-embeddings = OllamaEmbeddings(model="mxbai-embed-large")
+# Embeddings Ollama (mis en cache sur disque, voir rag_common/embedding_cache.py)
+embeddings = CachedEmbeddings(
+    OllamaEmbeddings(model="mxbai-embed-large"),
+    model_name="ollama/mxbai-embed-large"
+)
+
+# Backend: "chroma" (par défaut) ou "numpy" (fichier unique, recherche exhaustive,
+# quantification optionnelle avec VECTOR_QUANTIZATION=int8|binary)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
 
 # Emplacement base de données
-db_location = "./chroma_langchain_db"
-add_documents = not os.path.exists(db_location)
+if VECTOR_BACKEND == "numpy":
+    db_location = "./restaurant_reviews.npvs"
+else:
+    db_location = "./chroma_langchain_db"
+
+# Hash de chaque ligne déjà indexée (id = numéro de ligne), pour n'ajouter
+# que les lignes nouvelles ou modifiées aux exécutions suivantes
+state_location = db_location.rstrip("/") + ".rows.sqlite"
+new_database = not os.path.exists(db_location)
 
 # Créer le vector store
-vector_store = Chroma(
-    collection_name="restaurant_reviews",
-    persist_directory=db_location,
-    embedding_function=embeddings
-)
+if VECTOR_BACKEND == "numpy":
+    vector_store = NumpyVectorStore(
+        embeddings,
+        path=db_location,
+        quantization=os.getenv("VECTOR_QUANTIZATION") or None
+    )
+else:
+    vector_store = Chroma(
+        collection_name="restaurant_reviews",
+        persist_directory=db_location,
+        embedding_function=embeddings
+    )
+
+
+# ----------------- Ingestion incrémentale -----------------
+def open_state(path=state_location):
+    """Base SQLite: hash par ligne + taille/date du CSV lors de la dernière indexation"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY, hash INTEGER NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def csv_signature(csv_path):
+    stat = os.stat(csv_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def save_vector_store():
+    # Chroma écrit sur disque tout seul; le store numpy garde ses écritures en mémoire
+    if isinstance(vector_store, NumpyVectorStore):
+        vector_store.persist()
+
+
+def ingest_chunk(conn, chunk, start):
+    """Ajoute/met à jour les lignes nouvelles ou modifiées d'un morceau du CSV; renvoie leur nombre"""
+    chunk = chunk.reset_index(drop=True)
+    row_ids = pd.RangeIndex(start, start + len(chunk))
+
+    # Hash vectorisé de chaque ligne, comparé à celui de la dernière indexation
+    hashes = pd.Series(pd.util.hash_pandas_object(chunk[COLUMNS], index=False).values.view(np.int64), index=row_ids)
+    known = pd.read_sql_query(
+        "SELECT id, hash FROM rows WHERE id BETWEEN ? AND ?", conn,
+        params=(start, start + len(chunk) - 1), index_col="id"
+    )["hash"]
+    changed = ~row_ids.isin(known.index) | (known.reindex(row_ids, fill_value=0).values != hashes.values)
+    if not changed.any():
+        return 0
+
+    # Documents construits colonne par colonne (pas de iterrows).
+    # "day" = date en entier AAAAMMJJ: Chroma ne filtre les intervalles que sur des nombres
+    rows = chunk[changed]
+    contents = (rows["Title"].fillna("").astype(str) + " " + rows["Review"].fillna("").astype(str)).tolist()
+    dates = pd.to_datetime(rows["Date"], errors="coerce")
+    days = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).fillna(0).astype(int).tolist()
+    metadatas = [{"rating": int(rating), "date": date, "day": day}
+                 for rating, date, day in zip(rows["Rating"].fillna(0).tolist(),
+                                              rows["Date"].fillna("").astype(str).tolist(), days)]
+    ids = [str(i) for i in row_ids[changed]]
+    changed_hashes = hashes[changed]
+
+    for offset in range(0, len(ids), EMBED_BATCH_SIZE):
+        batch = slice(offset, offset + EMBED_BATCH_SIZE)
+        # add_texts remplace les documents dont l'id existe déjà (upsert)
+        vector_store.add_texts(contents[batch], metadatas=metadatas[batch], ids=ids[batch])
+
+    # Les hash ne sont enregistrés qu'une fois les vecteurs sur disque
+    save_vector_store()
+    conn.executemany(
+        "INSERT OR REPLACE INTO rows (id, hash) VALUES (?, ?)",
+        zip(changed_hashes.index.tolist(), changed_hashes.tolist())
+    )
+    conn.commit()
+    return len(ids)
+
+
+def ingest_reviews(csv_path=CSV_PATH):
+    """Indexe le CSV par morceaux; seules les lignes nouvelles/modifiées sont embarquées"""
+    conn = open_state()
+    try:
+        schema = conn.execute("SELECT value FROM meta WHERE key = 'metadata_version'").fetchone()
+        if new_database or not schema or schema[0] != METADATA_VERSION:
+            # Base vectorielle supprimée/jamais créée, ou métadonnées d'un ancien format: tout réindexer
+            conn.execute("DELETE FROM rows")
+            conn.execute("DELETE FROM meta")
+
+        # CSV inchangé depuis la dernière exécution: rien à lire
+        signature = csv_signature(csv_path)
+        previous = conn.execute("SELECT value FROM meta WHERE key = 'csv'").fetchone()
+        if previous and previous[0] == signature:
+            return {"rows": None, "updated": 0, "deleted": 0}
+
+        total, updated, latest = 0, 0, ""
+        for chunk in pd.read_csv(csv_path, usecols=COLUMNS, chunksize=CSV_CHUNK_ROWS):
+            updated += ingest_chunk(conn, chunk, total)
+            total += len(chunk)
+            latest = max([latest] + chunk["Date"].dropna().astype(str).tolist())
+
+        # Lignes disparues du CSV (fichier plus court qu'avant)
+        stale = [str(row_id) for (row_id,) in conn.execute("SELECT id FROM rows WHERE id >= ?", (total,))]
+        if stale:
+            vector_store.delete(ids=stale)
+            save_vector_store()
+            conn.execute("DELETE FROM rows WHERE id >= ?", (total,))
+
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                         [("csv", signature), ("latest_date", latest), ("metadata_version", METADATA_VERSION)])
+        conn.commit()
+        return {"rows": total, "updated": updated, "deleted": len(stale)}
+    finally:
+        conn.close()
+
+
+stats = ingest_reviews()
+if stats["rows"] is not None:
+    # Sur stderr: stdout peut recevoir les résultats JSONL de main.py --batch
+    print(f"✅ {stats['rows']} avis lus, {stats['updated']} ajoutés/modifiés, {stats['deleted']} supprimés",
+          file=sys.stderr)
+
+# Date de l'avis le plus récent ("recent" dans une question est relatif à cette date)
+def latest_review_date():
+    conn = open_state()
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'latest_date'").fetchone()
+        return row[0] if row and row[0] else None
+    finally:
+        conn.close()
+
+
+LATEST_REVIEW_DATE = latest_review_date()
+
+
+# ----------------- Filtres -----------------
+def _day(value):
+    """'2024-03-15' / date / datetime -> 20240315"""
+    value = pd.Timestamp(value)
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+def build_filter(min_rating=None, max_rating=None, start_date=None, end_date=None):
+    """Filtre de métadonnées (syntaxe "where" de Chroma, aussi comprise par NumpyVectorStore), None = aucun"""
+    conditions = []
+    if min_rating is not None:
+        conditions.append({"rating": {"$gte": int(min_rating)}})
+    if max_rating is not None:
+        conditions.append({"rating": {"$lte": int(max_rating)}})
+    if start_date is not None:
+        conditions.append({"day": {"$gte": _day(start_date)}})
+    if end_date is not None:
+        conditions.append({"day": {"$lte": _day(end_date)}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def get_retriever(k=5, **filters):
+    """Retriever limité aux avis qui passent le filtre (appliqué avant le calcul de similarité)"""
+    where = build_filter(**filters)
+    search_kwargs = {"k": k}
+    if where is not None:
+        search_kwargs["filter"] = where
+    return vector_store.as_retriever(search_kwargs=search_kwargs)
 
-if add_documents:
-    documents = []
-    ids = []
-    for i, row in df.iterrows():
-        doc = Document(
-            page_content=row["title"] + " " + row["Review"],  # <- adjust column names
-            metadata={"rating": row["Rating"], "date": row["Date"]},
-            id=str(i)
-        )
-        documents.append(doc)
-        ids.append(str(i))
-
-    vector_store.add_documents(documents=documents, ids=ids)
-    vector_store.persist()
 
 # Créer un retriever
-retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-
-# Test query
-query = "Which pizza is the spiciest?"
-results = retriever.get_relevant_documents(query)
-for doc in results:
-    print(doc.page_content, doc.metadata)
-    print("------")
+retriever = get_retriever(k=5)
+
+if __name__ == "__main__":
+    # Test query
+    query = "Which pizza is the spiciest?"
+    results = retriever.get_relevant_documents(query)
+    for doc in results:
+        print(doc.page_content, doc.metadata)
+        print("------")
@@ -0,0 +1,4 @@
+"""Modules shared by the Mistral and langchain_local apps (context_builder, embedding_cache, numpy_store, file_lock).
+
+Each app puts the repository root on sys.path through its common_path.py.
+"""
@@ -0,0 +1,142 @@
+import math
+import os
+import re
+
+from langchain_core.documents import Document
+
+# Builds the context part of a RAG prompt from retrieved chunks, best first:
+#
+#   1. overlapping chunks of the same source (chunk_overlap) are merged into one
+#      passage, and chunks contained in another one are dropped
+#   2. chunks mostly repeating a better-ranked passage (>= DUPLICATE_THRESHOLD of
+#      their word shingles already in it) are dropped
+#   3. optionally, each passage is trimmed to the sentences sharing words with the query
+#   4. passages are added in rank order until the token budget is used; the last
+#      one is cut at a sentence boundary if it does not fit
+#
+# Prompt prefill time grows with prompt length, so every token cut here is
+# latency saved. Tokens are estimated at CHARS_PER_TOKEN characters each unless
+# a real tokenizer's count function is passed as count_tokens.
+# Shared by Mistral/ and langchain_local/.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_TRIM = os.getenv("CONTEXT_TRIM", "0") == "1"  # extractive sentence trimming against the query
+CHARS_PER_TOKEN = 4
+DUPLICATE_THRESHOLD = 0.8
+MIN_OVERLAP = 20     # shortest shared prefix/suffix (characters) treated as chunk overlap
+MAX_OVERLAP = 400
+MIN_PARTIAL_TOKENS = 32  # don't bother adding a cut passage shorter than this
+
+_WORD_RE = re.compile(r"\w+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i in is it its of on or that the their this "
+    "to was were what when where which who why will with you your about any can did there they".split()
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _shingles(text, size=3):
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _overlap(left, right):
+    """Length of the longest suffix of left that is a prefix of right (0 if shorter than MIN_OVERLAP)"""
+    for size in range(min(len(left), len(right), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge_overlapping(docs):
+    """Merge chunks of the same source file whose ends overlap; drop chunks contained in another.
+
+    Merged passages keep the rank, metadata and id of their best-ranked chunk.
+    """
+    merged = []
+    for doc in docs:
+        text, source = doc.page_content, doc.metadata.get("source")
+        for i, other in enumerate(merged):
+            if source is None or other.metadata.get("source") != source:
+                continue
+            if text in other.page_content:
+                break
+            if other.page_content in text:
+                merged[i] = Document(page_content=text, metadata=other.metadata, id=other.id)
+                break
+            size = _overlap(other.page_content, text)
+            if size:
+                merged[i] = Document(page_content=other.page_content + text[size:], metadata=other.metadata, id=other.id)
+                break
+            size = _overlap(text, other.page_content)
+            if size:
+                merged[i] = Document(page_content=text + other.page_content[size:], metadata=other.metadata, id=other.id)
+                break
+        else:
+            merged.append(doc)
+    return merged
+
+
+def _drop_near_duplicates(docs):
+    kept, kept_shingles = [], []
+    for doc in docs:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / len(shingles) >= DUPLICATE_THRESHOLD for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def trim_to_query(text, query):
+    """Keep only the sentences sharing a content word with the query (the whole text if none do)"""
+    terms = {word for word in _WORD_RE.findall(query.lower()) if word not in STOPWORDS}
+    sentences = _SENTENCE_RE.split(text.strip())
+    if not terms or len(sentences) < 2:
+        return text
+    relevant = [s for s in sentences if terms & set(_WORD_RE.findall(s.lower()))]
+    return " ".join(relevant) if relevant else text
+
+
+def _cut(text, max_tokens, count_tokens):
+    """Longest run of leading sentences fitting in max_tokens"""
+    kept = []
+    for sentence in _SENTENCE_RE.split(text.strip()):
+        if count_tokens(" ".join(kept + [sentence])) > max_tokens:
+            break
+        kept.append(sentence)
+    return " ".join(kept)
+
+
+def select_context(docs, query=None, max_tokens=CONTEXT_TOKEN_BUDGET, trim=CONTEXT_TRIM, count_tokens=estimate_tokens):
+    """Deduplicated, merged and budgeted Documents to put in the prompt, best first"""
+    passages = _drop_near_duplicates(_merge_overlapping([doc for doc in docs if doc.page_content.strip()]))
+
+    selected, used = [], 0
+    for doc in passages:
+        text = trim_to_query(doc.page_content, query) if trim and query else doc.page_content
+        tokens = count_tokens(text)
+        if used + tokens > max_tokens:
+            remaining = max_tokens - used
+            if remaining >= MIN_PARTIAL_TOKENS:
+                text = _cut(text, remaining, count_tokens)
+                if text:
+                    selected.append(Document(page_content=text, metadata=doc.metadata, id=doc.id))
+            break
+        selected.append(Document(page_content=text, metadata=doc.metadata, id=doc.id))
+        used += tokens
+    return selected
+
+
+def build_context(docs, query=None, max_tokens=CONTEXT_TOKEN_BUDGET, trim=CONTEXT_TRIM, count_tokens=estimate_tokens,
+                  separator="\n\n"):
+    """Context string for a prompt (see select_context)"""
+    selected = select_context(docs, query, max_tokens=max_tokens, trim=trim, count_tokens=count_tokens)
+    return separator.join(doc.page_content for doc in selected)
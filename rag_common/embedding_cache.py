@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .file_lock import FileLock
+
+# On-disk layout for one model (cache_dir/<model>/):
+#   meta.json    - dimension, capacity (slots allocated so far) and max_entries
+#   vectors.f32  - memory-mapped float32 matrix, one row per slot
+#   keys.bin     - 16-byte hash of (model name, text) for each slot
+#   used.bin     - int64 "last used" tick per slot, 0 = empty (drives LRU eviction)
+#
+# Everything lives in memory-mapped files, so there is no index to
+# serialise: reopening the cache rebuilds the key -> slot dict from keys.bin.
+# Each lookup re-checks the slot's key, so if another process reuses a slot
+# we get a cache miss, never a wrong vector.
+#
+# The files start with INITIAL_CAPACITY slots and double (and are remapped)
+# whenever they fill up, so a small cache stays small on disk; only once
+# max_entries slots exist are the least recently used ones evicted.
+
+DEFAULT_CACHE_DIR = "embedding_cache"
+DEFAULT_MAX_ENTRIES = 200_000
+INITIAL_CAPACITY = 1024
+
+
+def _safe_name(model_name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that keeps every vector it computes in a size-bounded disk cache"""
+
+    def __init__(self, embeddings, model_name, cache_dir=DEFAULT_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, _safe_name(model_name))
+        self.max_entries = max_entries
+        self.capacity = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(os.path.join(self.path, "cache.lock"))  # creating, growing and claiming slots
+        self._slots = {}
+        self._vectors = None
+        self._tick = 0
+
+        meta = self._read_meta()
+        if meta is not None:
+            self._open(meta)
+
+    # ----------------- Storage -----------------
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        meta.setdefault("capacity", meta["max_entries"])  # caches written before the files could grow
+        return meta
+
+    def _write_meta(self, dim, capacity):
+        meta_path = os.path.join(self.path, "meta.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": dim, "capacity": capacity,
+                       "max_entries": self.max_entries}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _map(self, name, dtype, shape, create):
+        """Memory-map one file, extending it with zeros (= empty slots) if it is shorter than shape"""
+        path = os.path.join(self.path, name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "wb" if create else "r+b") as f:  # "wb" empties files left by an interrupted create
+            if os.fstat(f.fileno()).st_size < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _open(self, meta, create=False):
+        self.max_entries = meta["max_entries"]
+        self.capacity = meta["capacity"]
+        shape = (self.capacity,)
+        self._release()
+        self._vectors = self._map("vectors.f32", np.float32, shape + (meta["dim"],), create)
+        self._keys = self._map("keys.bin", np.uint8, shape + (16,), create)
+        self._used = self._map("used.bin", np.int64, shape, create)
+
+        occupied = np.nonzero(self._used)[0]
+        self._slots = {self._keys[slot].tobytes(): int(slot) for slot in occupied}
+        self._tick = int(self._used.max()) if len(occupied) else 0
+
+    def _release(self):
+        """Drop the current mappings (a mapped file can't be extended on Windows)"""
+        if self._vectors is not None:
+            for array in (self._vectors, self._keys, self._used):
+                array.flush()
+            self._vectors = self._keys = self._used = None
+
+    def _create(self, dim):
+        with self._file_lock:
+            meta = self._read_meta()  # another process may have created the cache meanwhile
+            if meta is None:
+                meta = {"dim": dim, "capacity": min(INITIAL_CAPACITY, self.max_entries), "max_entries": self.max_entries}
+                self._open(meta, create=True)
+                self._write_meta(dim, meta["capacity"])
+            else:
+                self._open(meta)
+
+    def _grow(self, needed):
+        """Double the files (and remap them) until `needed` slots fit, up to max_entries"""
+        with self._file_lock:
+            meta = self._read_meta()  # another process may have grown the files already
+            capacity = max(meta["capacity"], self.capacity, 1)
+            while capacity < needed:
+                capacity *= 2
+            meta["capacity"] = min(capacity, self.max_entries)
+            self._open(meta)  # extends the files, then rebuilds the slot dict from them
+            self._write_meta(meta["dim"], meta["capacity"])
+
+    def _key(self, namespace, text):
+        data = f"{self.model_name}\0{namespace}\0{text}".encode("utf-8")
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def _lookup(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        vector = np.array(self._vectors[slot])
+        if self._keys[slot].tobytes() != key:
+            # Slot was reused (or is being rewritten) by another process sharing this cache
+            del self._slots[key]
+            return None
+        self._tick += 1
+        self._used[slot] = self._tick
+        return vector
+
+    def _free_slots(self, count):
+        """Pick `count` slots to write into, growing the files or else evicting the least recently used ones"""
+        empty = np.nonzero(self._used == 0)[0]
+        if len(empty) < count and self.capacity < self.max_entries:
+            self._grow(self.capacity - len(empty) + count)
+            empty = np.nonzero(self._used == 0)[0]
+        empty = empty[:count]
+        if len(empty) >= count:
+            return [int(s) for s in empty]
+
+        needed = count - len(empty)
+        victims = np.argpartition(np.where(self._used == 0, np.iinfo(np.int64).max, self._used), needed - 1)[:needed]
+        for slot in victims:
+            self._slots.pop(self._keys[slot].tobytes(), None)
+        return [int(s) for s in empty] + [int(s) for s in victims]
+
+    def _store(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self._vectors is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._create(vectors.shape[1])
+
+        keys, vectors = keys[-self.max_entries:], vectors[-self.max_entries:]
+        # Under the file lock, so two processes never claim the same free slot
+        with self._file_lock:
+            slots = self._free_slots(len(keys))
+            for key, slot, vector in zip(keys, slots, vectors):
+                self._tick += 1
+                self._keys[slot] = 0  # readers copying the old vector see a key mismatch, not a torn row
+                self._vectors[slot] = vector
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._used[slot] = self._tick
+                self._slots[key] = slot
+
+            self._vectors.flush()
+            self._keys.flush()
+            self._used.flush()
+
+    # ----------------- Embeddings interface -----------------
+    def _embed(self, namespace, texts, compute):
+        keys = [self._key(namespace, text) for text in texts]
+        results = [None] * len(texts)
+
+        with self._lock:
+            if self._vectors is not None:
+                for i, key in enumerate(keys):
+                    results[i] = self._lookup(key)
+
+        # Compute each distinct missing text once
+        missing = {}
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                missing.setdefault(key, []).append(i)
+
+        with self._lock:
+            self.hits += len(texts) - sum(len(idx) for idx in missing.values())
+            self.misses += len(missing)
+
+        if missing:
+            missing_keys = list(missing)
+            vectors = compute([texts[missing[key][0]] for key in missing_keys])
+            with self._lock:
+                self._store(missing_keys, vectors)
+            for key, vector in zip(missing_keys, vectors):
+                for i in missing[key]:
+                    results[i] = np.asarray(vector, dtype=np.float32)
+
+        return [vector.tolist() for vector in results]
+
+    def embed_documents(self, texts):
+        """Embed documents, computing only the ones not already cached"""
+        return self._embed("doc", list(texts), self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        """Embed a query, reusing the cached vector for repeated queries"""
+        return self._embed("query", [text], lambda texts: [self.embeddings.embed_query(texts[0])])[0]
+
+    def embed_queries(self, texts):
+        """Embed many queries in one batch (for models whose query and document embeddings are the same)"""
+        return self._embed("query", list(texts), self.embeddings.embed_documents)
@@ -0,0 +1,488 @@
+import json
+import operator
+import os
+import struct
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from .file_lock import FileLock
+
+# Brute-force vector store for small and medium collections.
+#
+# Vectors are kept unit-length in one contiguous float32 matrix, so cosine
+# similarity is a single matrix-vector product. With quantization="int8" or
+# "binary" a compact copy (4x / 32x smaller) is scanned instead, and only the
+# best candidates are rescored against the exact float32 rows.
+#
+# Everything is persisted to a single file:
+#   8-byte magic | uint64 header length | JSON header (ids, texts, metadata) | padding | float32 matrix
+# On load the matrix is memory-mapped rather than read, so with quantization
+# only the compact copy and the few rescored rows are resident in memory.
+# The compact copy itself is not saved: loading recomputes it with one pass
+# over the matrix (block by block), which costs read time but no extra memory.
+#
+# Writes stay in the process until persist() is called. The loaded mapping is
+# read-only, so the first write after a load copies the matrix into a writable
+# one, with room to grow (capacity doubles each time it runs out). For a store
+# with a path that copy is a memory-mapped scratch file next to it, deleted
+# when the store is closed: it goes through the OS page cache instead of
+# being held in the process's memory, and costs a disk copy of the matrix
+# (up to twice its size on disk) rather than twice its size in RAM. Stores
+# without a path grow in RAM.
+#
+# Several processes can share one file. Before each write the store reloads
+# the file if another process saved it since (when it has nothing unsaved),
+# and it logs its unsaved adds and deletes. persist() holds a lock file
+# (path + ".lock") while it reloads the latest file, replays that log on top
+# of it and writes the result, so no process overwrites another's saved
+# writes with its stale copy.
+#
+# Metadata filters use Chroma's syntax ({"rating": {"$gte": 4}}, "$and", ...)
+# and are applied before scoring: each filtered field gets a sorted index
+# (built on first use, rebuilt after writes), ranges are binary searches in
+# it, and several conditions are combined as row bitmaps. Only the matching
+# rows are scored, so a narrow filter stays fast however large the store is.
+
+MAGIC = b"NPVSTORE"
+_PREFIX = struct.Struct("<8sQ")
+_ALIGN = 64
+_BLOCK_ROWS = 8192  # rows scored per block when scanning quantized copies
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_COMPARE = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+
+
+def _json_default(value):
+    # numpy / pandas scalars in metadata (e.g. ratings read with pandas)
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _matches(value, condition):
+    """Check one metadata value against {"$op": operand, ...} (used when a field can't be indexed)"""
+    for op, operand in condition.items():
+        if op == "$in":
+            ok = value in operand
+        elif op == "$nin":
+            ok = value not in operand
+        elif op == "$ne":
+            ok = value != operand
+        elif op == "$eq":
+            ok = value == operand
+        elif op in _COMPARE:
+            try:
+                ok = value is not None and _COMPARE[op](value, operand)
+            except TypeError:
+                ok = False
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorStore(VectorStore):
+    """In-memory / memory-mapped vector store with optional int8 or binary quantization"""
+
+    def __init__(self, embedding, path=None, quantization=None, oversample=None):
+        if quantization not in (None, "int8", "binary"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self._embedding = embedding
+        self.path = path
+        self.quantization = quantization
+        self.oversample = oversample or (10 if quantization == "binary" else 4)
+
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path + ".lock") if path else None
+        self._reset()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _reset(self):
+        self._matrix = None      # float32 rows, capacity >= count (read-only np.memmap right after load)
+        self._quantized = None   # int8 rows or packed sign bits, same row order
+        self._count = 0
+        self.ids, self.texts, self.metadatas = [], [], []
+        self._rows = {}
+        self._dirty = False
+        self._pending = []        # unsaved ("add", ids, texts, metadatas, vectors) / ("delete", ids), in order
+        self._loaded_stamp = None
+        self._field_indexes = {}  # metadata field -> (sorted values, their rows), or None if not indexable
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return self._count
+
+    # ----------------- Storage -----------------
+    def _quantize(self, rows):
+        if self.quantization == "int8":
+            return np.clip(np.rint(rows * 127), -127, 127).astype(np.int8)
+        return np.packbits(rows > 0, axis=-1)
+
+    def _new_matrix(self, rows, dim):
+        """Writable float32 rows: a memory-mapped scratch file next to the store if it has a path"""
+        if not self.path:
+            return np.empty((rows, dim), dtype=np.float32)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Deleted by the OS once the file and its mapping are closed
+        scratch = tempfile.TemporaryFile(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".grow")
+        with scratch:
+            return np.memmap(scratch, dtype=np.float32, mode="w+", shape=(rows, dim))
+
+    def _reserve(self, extra, dim):
+        """Make sure the matrices are writable with room for `extra` rows"""
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        writable = self._matrix is not None and self._matrix.flags.writeable
+        if writable and self._count + extra <= capacity:
+            return
+
+        new_capacity = max(self._count + extra, capacity * 2, 64)
+        matrix = self._new_matrix(new_capacity, dim)
+        if self._count:
+            matrix[:self._count] = self._matrix[:self._count]
+        self._matrix = matrix
+
+        if self.quantization is not None:
+            width = dim if self.quantization == "int8" else (dim + 7) // 8
+            dtype = np.int8 if self.quantization == "int8" else np.uint8
+            quantized = np.empty((new_capacity, width), dtype=dtype)
+            if self._count:
+                quantized[:self._count] = self._quantized[:self._count]
+            self._quantized = quantized
+
+    def _load(self):
+        # Header, matrix and stamp all come from one open file, so a concurrent save
+        # (which replaces the file) can't mix two versions
+        with open(self.path, "rb") as f:
+            magic, header_length = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a NumpyVectorStore file")
+            header = json.loads(f.read(header_length))
+
+            self._reset()
+            self.ids, self.texts, self.metadatas = header["ids"], header["texts"], header["metadatas"]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+            self._count = header["count"]
+            if self._count:
+                offset = _PREFIX.size + header_length
+                offset += (-offset) % _ALIGN
+                self._matrix = np.memmap(f, dtype=np.float32, mode="r", offset=offset,
+                                         shape=(self._count, header["dim"]))
+                if self.quantization is not None:
+                    self._quantized = np.concatenate([
+                        self._quantize(self._matrix[start:start + _BLOCK_ROWS])
+                        for start in range(0, self._count, _BLOCK_ROWS)
+                    ])
+            self._loaded_stamp = self._file_stamp(os.fstat(f.fileno()))
+
+    def _file_stamp(self, st=None):
+        """Identifies one version of the file (each save replaces it), None if there is no file"""
+        if st is None:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _maybe_reload(self):
+        """Pick up a newer file written by another process (unless we have unsaved changes)"""
+        if not self.path or self._dirty:
+            return
+        stamp = self._file_stamp()
+        if stamp is not None and stamp != self._loaded_stamp:
+            self._load()
+
+    def persist(self):
+        """Write the store to its file (atomically), on top of what other processes saved meanwhile"""
+        if not self.path:
+            raise ValueError("NumpyVectorStore was created without a path")
+        with self._lock, self._file_lock:
+            if not self._dirty and os.path.exists(self.path):
+                return
+            stamp = self._file_stamp()
+            if stamp is not None and stamp != self._loaded_stamp:
+                # Another process saved since we loaded: replay our unsaved writes on its file
+                pending = self._pending
+                self._load()
+                for op in pending:
+                    if op[0] == "add":
+                        self._apply_add(*op[1:])
+                    else:
+                        self._apply_delete(op[1])
+            dim = 0 if self._matrix is None else self._matrix.shape[1]
+            header = json.dumps({
+                "dim": dim,
+                "count": self._count,
+                "ids": self.ids,
+                "texts": self.texts,
+                "metadatas": self.metadatas,
+            }, default=_json_default).encode("utf-8")
+            offset = _PREFIX.size + len(header)
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_PREFIX.pack(MAGIC, len(header)))
+                f.write(header)
+                f.write(b"\0" * ((-offset) % _ALIGN))
+                if self._count:
+                    np.ascontiguousarray(self._matrix[:self._count]).tofile(f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+            self._pending = []
+            self._loaded_stamp = self._file_stamp()
+
+    # ----------------- Writes -----------------
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = _normalize(self._embedding.embed_documents(texts))
+
+        with self._lock:
+            self._maybe_reload()
+            self._apply_add(ids, texts, metadatas, vectors)
+            if self.path:
+                self._pending.append(("add", ids, texts, metadatas, vectors))
+        return ids
+
+    def _apply_add(self, ids, texts, metadatas, vectors):
+        """Upsert rows (caller holds the lock)"""
+        self._reserve(len(texts), vectors.shape[1])
+        for doc_id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+            row = self._rows.get(doc_id)
+            if row is None:
+                row = self._count
+                self._count += 1
+                self._rows[doc_id] = row
+                self.ids.append(doc_id)
+                self.texts.append(text)
+                self.metadatas.append(metadata or {})
+            else:
+                self.texts[row] = text
+                self.metadatas[row] = metadata or {}
+            self._matrix[row] = vector
+            if self.quantization is not None:
+                self._quantized[row] = self._quantize(vector)
+        self._dirty = True
+        self._field_indexes.clear()
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        with self._lock:
+            self._maybe_reload()
+            if self.path:
+                # Logged even if unknown here: another process's saved file may have them
+                self._pending.append(("delete", list(ids)))
+                self._dirty = True
+            return self._apply_delete(ids)
+
+    def _apply_delete(self, ids):
+        """Remove rows, False if none of the ids exist (caller holds the lock)"""
+        rows_to_delete = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+        if not rows_to_delete:
+            return False
+        self._reserve(0, self._matrix.shape[1])
+        # Delete from the highest row down, moving the last row into each hole
+        for row in sorted(rows_to_delete, reverse=True):
+            last = self._count - 1
+            del self._rows[self.ids[row]]
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                if self.quantization is not None:
+                    self._quantized[row] = self._quantized[last]
+                self.ids[row], self.texts[row], self.metadatas[row] = self.ids[last], self.texts[last], self.metadatas[last]
+                self._rows[self.ids[row]] = row
+            self.ids.pop()
+            self.texts.pop()
+            self.metadatas.pop()
+            self._count -= 1
+        self._dirty = True
+        self._field_indexes.clear()
+        return True
+
+    # ----------------- Reads -----------------
+    def _document(self, row):
+        return Document(page_content=self.texts[row], metadata=self.metadatas[row], id=self.ids[row])
+
+    def get_by_ids(self, ids, /):
+        with self._lock:
+            return [self._document(self._rows[doc_id]) for doc_id in ids if doc_id in self._rows]
+
+    def get(self, ids=None, include=None, **kwargs):
+        """Chroma-style bulk read: {"ids": [...], "documents": [...], "metadatas": [...]}"""
+        with self._lock:
+            rows = range(self._count) if ids is None else [self._rows[i] for i in ids if i in self._rows]
+            return {
+                "ids": [self.ids[row] for row in rows],
+                "documents": [self.texts[row] for row in rows],
+                "metadatas": [self.metadatas[row] for row in rows],
+            }
+
+    # ----------------- Metadata filters -----------------
+    def _field_index(self, field):
+        """(sorted values, rows) for a metadata field, or None if its values can't be ordered"""
+        if field not in self._field_indexes:
+            rows = [row for row in range(self._count) if self.metadatas[row].get(field) is not None]
+            values = np.array([self.metadatas[row][field] for row in rows])
+            index = None
+            if values.dtype != object and (values.dtype.kind in "biuf" or values.dtype.kind == "U"):
+                order = np.argsort(values, kind="stable")
+                index = (values[order], np.asarray(rows, dtype=np.int64)[order])
+            self._field_indexes[field] = index
+        return self._field_indexes[field]
+
+    def _condition_mask(self, field, condition):
+        """Row bitmap for one field condition ({"$gte": 4}, a plain value, ...)"""
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        index = self._field_index(field)
+        mask = np.zeros(self._count, dtype=bool)
+
+        if index is None:
+            # Mixed or unorderable values: check each row
+            rows = [row for row in range(self._count) if _matches(self.metadatas[row].get(field), condition)]
+            mask[rows] = True
+            return mask
+
+        values, rows = index
+        lo, hi = 0, len(values)
+        others = {}
+        try:
+            for op, operand in condition.items():
+                if op in ("$gt", "$gte"):
+                    lo = max(lo, np.searchsorted(values, operand, side="right" if op == "$gt" else "left"))
+                elif op in ("$lt", "$lte"):
+                    hi = min(hi, np.searchsorted(values, operand, side="left" if op == "$lt" else "right"))
+                elif op == "$eq":
+                    lo = max(lo, np.searchsorted(values, operand, side="left"))
+                    hi = min(hi, np.searchsorted(values, operand, side="right"))
+                else:
+                    others[op] = operand
+        except TypeError:
+            # Operand not comparable with the indexed values (e.g. a string against numbers)
+            return mask
+        if lo < hi:
+            mask[rows[lo:hi]] = True
+        if others:
+            allowed = np.array([_matches(self.metadatas[row].get(field), others) for row in range(self._count)])
+            mask &= allowed
+        return mask
+
+    def _filter_mask(self, filter):
+        """Row bitmap for a Chroma-style where clause"""
+        mask = np.ones(self._count, dtype=bool)
+        for key, condition in filter.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._filter_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(self._count, dtype=bool)
+                for clause in condition:
+                    any_mask |= self._filter_mask(clause)
+                mask &= any_mask
+            else:
+                mask &= self._condition_mask(key, condition)
+        return mask
+
+    def _candidate_rows(self, filter):
+        """Rows allowed by a metadata filter (Chroma-style where dict, or a callable), None = all"""
+        if filter is None:
+            return None
+        if callable(filter):
+            return np.array([row for row in range(self._count) if filter(self.metadatas[row])], dtype=np.int64)
+        return np.flatnonzero(self._filter_mask(filter))
+
+    def _scan(self, query, rows):
+        """Approximate scores (higher = better) from the quantized copy, or exact if unquantized"""
+        source = self._matrix if self.quantization is None else self._quantized
+        if rows is not None:
+            source = source[rows]
+        else:
+            source = source[:self._count]
+
+        if self.quantization is None:
+            return source @ query
+
+        scores = np.empty(len(source), dtype=np.float32)
+        if self.quantization == "int8":
+            for start in range(0, len(source), _BLOCK_ROWS):
+                scores[start:start + _BLOCK_ROWS] = source[start:start + _BLOCK_ROWS].astype(np.float32) @ query
+        else:
+            query_bits = np.packbits(query > 0)
+            for start in range(0, len(source), _BLOCK_ROWS):
+                block = np.bitwise_xor(source[start:start + _BLOCK_ROWS], query_bits)
+                scores[start:start + _BLOCK_ROWS] = -_POPCOUNT[block].sum(axis=1, dtype=np.int32)
+        return scores
+
+    def _search(self, embedding, k, filter=None, rows=None):
+        """[(row, cosine similarity)] of the top-k rows, best first"""
+        with self._lock:
+            self._maybe_reload()
+            if rows is None:
+                rows = self._candidate_rows(filter)
+            available = self._count if rows is None else len(rows)
+            if available == 0 or k <= 0:
+                return []
+
+            query = _normalize(embedding)
+            scores = self._scan(query, rows)
+            k = min(k, available)
+
+            if self.quantization is None:
+                top = np.argpartition(-scores, k - 1)[:k]
+                candidates = top if rows is None else rows[top]
+                exact = scores[top]
+            else:
+                # Exact float32 rescoring of the best quantized candidates
+                n_candidates = min(available, k * self.oversample)
+                top = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+                candidates = np.sort(top if rows is None else rows[top])
+                exact = self._matrix[candidates] @ query
+
+            best = np.argsort(-exact)[:k]
+            return [(int(candidates[i]), float(exact[i])) for i in best]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        """Top-k (document, cosine distance) pairs; lower distance = more similar"""
+        with self._lock:
+            return [(self._document(row), 1.0 - score) for row, score in self._search(embedding, k, filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def _select_relevance_score_fn(self):
+        return lambda distance: 1.0 - distance
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, path=None, quantization=None, **kwargs):
+        store = cls(embedding, path=path, quantization=quantization)
+        store.add_texts(texts, metadatas, ids=ids)
+        if path:
+            store.persist()
+        return store